@@ -1,24 +1,75 @@
-from typing import Union
+from typing import Dict, Union
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.encoders import jsonable_encoder
 from fastapi.params import Body
-from fastapi import Request, Header
+from fastapi import Request, Header, Query
 from starlette import status
 from starlette.responses import JSONResponse
 
 from app.db import DatabaseManager, get_database
-from app.db.impl.community_manager import CommunityManager, GetCommunityManager
-from app.adapters.dtos.community_details import UserNameResponse
+from app.adapters.dtos.cursor_page import CursorPage
+from app.db.impl.cursor_pagination import InvalidCursorError
+from app.db.impl.community_manager import CommunityManager, GetCommunityManager, \
+    MAX_USERS_PER_COMM
 from app.adapters.dtos.community_details import CommunityDetailResponse
-from app.db.impl.user_manager import UserManager, GetUserManager
+from app.db.impl.user_manager import UserManager, GetUserManager, MAX_COMMUNITIES_PER_USER
 import logging
 import traceback
 from app.db.model.community import CommunityModel, UpdateCommunityModel
 from fastapi_pagination import Page
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter(tags=["communities"])
 
-MAX_USERS_PER_COMM = 11
+
+async def community_slot_error(user_manager: UserManager, user_id: str) -> HTTPException:
+    """
+        Why the user could not take one more community
+    """
+    user = await user_manager.get_by_id(user_id)
+    if user is None:
+        return HTTPException(status_code=404, detail=f"User {user_id} not found")
+    if user.is_profile_complete is False:
+        return HTTPException(
+            status_code=400,
+            detail=f"user_id {user_id} has not complete his profile"
+        )
+    return HTTPException(
+        status_code=400,
+        detail=f"user can't be in more than {MAX_COMMUNITIES_PER_USER} communities"
+    )
+
+
+def join_error(community: Union[Dict, None], community_id: str, user_id: str,
+               password: Union[str, None]) -> HTTPException:
+    """
+        Why the user could not join the community, from the community as it is now
+    """
+    if community is None:
+        return HTTPException(status_code=404, detail=f"Community {community_id} not found")
+    if community.get("password") != password:
+        return HTTPException(
+            status_code=401, detail=f"Wrong password. "
+                                    f"User {user_id} could not join community {community_id}"
+        )
+    if community.get("is_blocked") is True:
+        return HTTPException(
+            status_code=401, detail=f"Community is blocked. "
+                                    f"User {user_id} could not join community {community_id}"
+        )
+    if len(community["users"]) >= MAX_USERS_PER_COMM:
+        return HTTPException(
+            status_code=400, detail=f"Full community."
+                                    f"User {user_id} could not join community {community_id}"
+        )
+    if user_id in community["users"]:
+        return HTTPException(
+            status_code=400, detail=f"User {user_id} already joined community {community_id}"
+        )
+    return HTTPException(
+        status_code=409,
+        detail=f"Community {community_id} changed while joining, please try again"
+    )
 
 
 @router.get(
@@ -26,7 +77,10 @@ MAX_USERS_PER_COMM = 11
     response_description="Get community by owner id or member id."
                          "If no parameter is specified, it will get all communities",
     status_code=status.HTTP_200_OK,
-    response_model=Page[CommunityModel],
+    response_model=Union[Page[CommunityModel], CursorPage[CommunityModel]],
+    description="With `cursor` the results are paginated by keyset instead of by page: "
+                "pass an empty cursor for the first page and then the `next_cursor` of the "
+                "previous page. `with_total` also counts all the results"
 )
 async def get_communities(
         owner: str = None,
@@ -34,8 +88,10 @@ async def get_communities(
         name: str = None,
         mail: str = None,
         blocked: bool = None,
-        size: int = 50,
+        size: int = Query(50, gt=0),
         page: int = 1,
+        cursor: str = None,
+        with_total: bool = False,
         manager: CommunityManager = Depends(GetCommunityManager),
         user_manager: UserManager = Depends(GetUserManager),
 ):
@@ -48,12 +104,18 @@ async def get_communities(
                     detail=f"Mail {mail} not found"
                 )
             users_ids = list(map(lambda o: o['_id'], users))
-            response = await manager.get_communities(users_ids, None, name, blocked, size, page)
+            response = await manager.get_communities(
+                users_ids, None, name, blocked, size, page, cursor, with_total
+            )
         else:
-            response = await manager.get_communities([owner], member, name, blocked, size, page)
+            response = await manager.get_communities(
+                [owner], member, name, blocked, size, page, cursor, with_total
+            )
         return response
     except HTTPException as e:
         raise e
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Error getting Communities. Exception {e}")
         logging.error(traceback.format_exc())
@@ -73,28 +135,19 @@ async def get_community_by_id(
     db: DatabaseManager = Depends(get_database),
 ):
     comm_manager = CommunityManager(db.db)
-    user_manager = UserManager(db.db)
     try:
         sender = request.headers['x-user-id']
-        comm = await comm_manager.get_by_id(id=community_id)
+        result = await comm_manager.get_with_members(id=community_id)
+        if result is None:
+            raise HTTPException(
+                status_code=404, detail=f"Community {community_id} not found"
+            )
+        comm, users = result
         if sender not in comm.users and sender != comm.owner:
             raise HTTPException(
                 status_code=401,
                 detail=f"User {sender} not allowed to access community {community_id}"
             )
-        users = []
-        for user_id in comm.users:
-            logging.info(user_id)
-            user_model = await user_manager.get_by_id(user_id)
-            logging.info(user_model)
-            if user_model is not None:
-                user = UserNameResponse(
-                    id=str(user_model.id),
-                    name=user_model.name,
-                    lastname=user_model.lastname,
-                    mail=user_model.mail
-                )
-                users.append(user)
         response = CommunityDetailResponse(
             id=str(comm.id),
             name=comm.name,
@@ -154,6 +207,11 @@ async def set_community_password(
         return result
     except HTTPException as e:
         raise e
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail='there is already a community with that name'
+        )
     except Exception as e:
         error_msg = f"Error updating Community by id {community_id}. Exception {e}"
         logging.error(error_msg)
@@ -172,40 +230,30 @@ async def set_community_password(
 )
 async def create_community(
         community: CommunityModel = Body(...),
-        db: DatabaseManager = Depends(get_database),
+        manager: CommunityManager = Depends(GetCommunityManager),
+        user_manager: UserManager = Depends(GetUserManager),
 ):
-    manager = CommunityManager(db.db)
-    user_manager = UserManager(db.db)
-
     try:
-        owner = await user_manager.get_by_id(community.owner)
-        if owner.is_profile_complete is False:
-            raise HTTPException(
-                status_code=400,
-                detail=f"user_id {community.owner} has not complete his profile"
-            )
-
-        comm = await manager.get_by_name(community.name)
-        if len(comm) != 0:
-            raise HTTPException(
-                status_code=400,
-                detail='there is already a community with that name'
-            )
+        if not await user_manager.reserve_community_slot(community.owner):
+            raise await community_slot_error(user_manager, community.owner)
 
-        comms = await manager.get_by_member(community.owner)
-        if len(comms) >= 10:
-            raise HTTPException(
-                status_code=400,
-                detail="user can't be in more than 10 communities"
-            )
-
-        community.users.append(community.owner)
-        response = await manager.add_new(community=community)
+        response = None
+        try:
+            community.users.append(community.owner)
+            response = await manager.add_new(community=community)
+        finally:
+            if response is None:
+                await user_manager.release_community_slot(community.owner)
         return JSONResponse(
             status_code=status.HTTP_201_CREATED, content=jsonable_encoder(response)
         )
     except HTTPException as e:
         raise e
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail='there is already a community with that name'
+        )
     except Exception as e:
         error_msg = f"Could not create Community Exception {e}"
         logging.error(error_msg)
@@ -225,50 +273,27 @@ async def join_community(
         community_id: str,
         user_id: str,
         password: str = None,
-        db: DatabaseManager = Depends(get_database),
+        manager: CommunityManager = Depends(GetCommunityManager),
+        user_manager: UserManager = Depends(GetUserManager),
 ):
-    manager = CommunityManager(db.db)
-    user_manager = UserManager(db.db)
-
     try:
-        user = await user_manager.get_by_id(user_id)
-        if user.is_profile_complete is False:
-            raise HTTPException(
-                status_code=400,
-                detail=f"user_id {user_id} has not complete his profile"
-            )
+        if not await user_manager.reserve_community_slot(user_id):
+            raise await community_slot_error(user_manager, user_id)
 
-        community = await manager.get_by_id(id=community_id)
-        if community.password != password:
-            raise HTTPException(
-                status_code=401, detail=f"Wrong password. "
-                                        f"User {user_id} could not join community {community_id}"
-            )
-        if community.is_blocked is True:
-            raise HTTPException(
-                status_code=401, detail=f"Community is blocked. "
-                                        f"User {user_id} could not join community {community_id}"
-            )
-        if len(community.users) == MAX_USERS_PER_COMM:
-            raise HTTPException(
-                status_code=400, detail=f"Full community."
-                                        f"User {user_id} could not join community {community_id}"
-            )
-        if user_id in community.users:
-            raise HTTPException(
-                status_code=400, detail=f"User {user_id} already joined community {community_id}"
-            )
-        comms = await manager.get_by_member(user_id)
-        if len(comms) >= 10:
-            raise HTTPException(
-                status_code=400,
-                detail="user can't be in more than 10 communities"
+        response = None
+        try:
+            response = await manager.join_community(
+                community_id=community_id,
+                user_id=user_id,
+                password=password
             )
+        finally:
+            if response is None:
+                await user_manager.release_community_slot(user_id)
+        if response is None:
+            community = await manager.get_community_by_id(community_id)
+            raise join_error(community, community_id, user_id, password)
 
-        response = await manager.join_community(
-            community_id=community_id,
-            user_id=user_id
-        )
         return JSONResponse(
             status_code=status.HTTP_200_OK, content=jsonable_encoder(response)
         )
@@ -312,6 +337,11 @@ async def update(
         return result
     except HTTPException as e:
         raise e
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail='there is already a community with that name'
+        )
     except Exception as e:
         error_msg = f"Error updating Community by id {community_id}. Exception {e}"
         logging.error(error_msg)
@@ -0,0 +1,11 @@
+from pydantic.generics import GenericModel
+from typing import Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CursorPage(GenericModel, Generic[T]):
+    items: List[T]
+    size: int
+    next_cursor: Optional[str]
+    total: Optional[int]
@@ -1,5 +1,20 @@
 from pydantic.main import BaseModel
+from typing import List
 
 
 class HealthStatusResponse(BaseModel):
     status: str
+
+
+class PackagePoolMetricsResponse(BaseModel):
+    running: bool
+    normal_size: int
+    special_size: int
+    normal_watermarks: List[int]
+    special_watermarks: List[int]
+    hits: int
+    misses: int
+    generated: int
+    discarded: int
+    refills: int
+    errors: int
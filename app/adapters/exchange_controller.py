@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, List
 from fastapi import APIRouter, Depends, HTTPException
@@ -11,7 +12,6 @@ from app.db.impl.sticker_manager import GetStickerManager
 from app.db.impl.user_manager import UserManager, GetUserManager
 from app.db.model.exchange import ExchangeModel, \
     ExchangeActionModel, AVAILABLE_EXCHANGE_ACTIONS, ACCEPT_ACTION, REJECT_ACTION
-from app.db.model.my_sticker import MyStickerModel
 from app.db.model.user import UserModel
 from app.firebase import FirebaseManager, GetFirebaseManager
 
@@ -90,9 +90,7 @@ async def create_exchange(
         # update user
         for sg in exchange.stickers_to_give:
             # sender must deliver stickers_to_give
-            for sticker in sender.stickers:
-                if sg == sticker.id:
-                    sticker.quantity -= 1
+            sender.get_sticker(sg).quantity -= 1
 
         await user_manager.update(exchange.sender_id, sender)
 
@@ -210,35 +208,17 @@ async def applyAccept(exchange: ExchangeModel, receiver_id: str):
     # Do exchange for stickers_to_receive
     for rs in exchange.stickers_to_receive:
         # receiver must deliver stickers_to_receive
-        for sticker in receiver.stickers:
-            if rs == sticker.id:
-                sticker.quantity -= 1
+        receiver.get_sticker(rs).quantity -= 1
 
         # sender must receive stickers_to_receive
-        found = False
-        for sticker in sender.stickers:
-            if rs == sticker.id:
-                found = True
-                sticker.quantity += 1
-
-        if not found:
-            newSticker = MyStickerModel(id=rs, quantity=1, is_on_album=False)
-            sender.stickers.append(newSticker)
+        sender.add_sticker(rs)
 
     # Do exchange for stickers_to_give
     for sg in exchange.stickers_to_give:
         # sender must deliver stickers_to_give, this action is moved to create exchange
 
         # receiver must receive stickers_to_give
-        found = False
-        for sticker in receiver.stickers:
-            if sg == sticker.id:
-                found = True
-                sticker.quantity += 1
-
-        if not found:
-            sticker = MyStickerModel(id=sg, quantity=1, is_on_album=False)
-            receiver.stickers.append(sticker)
+        receiver.add_sticker(sg)
 
     # Update statistics
     receiver.exchanges_amount += 1
@@ -310,34 +290,18 @@ async def get_available_exchanges(
     community_manager: CommunityManager = Depends(GetCommunityManager),
 ):
     try:
-        communities = await community_manager.get_by_member(user_id)
-        if community_id not in [c['_id'] for c in communities]:
+        community = await community_manager.get_community_by_id(community_id)
+        if community is None or user_id not in community['users']:
             raise HTTPException(
                 status_code=404,
                 detail=f"user_id: {user_id} does not belong to the community_id: {community_id}"
             )
 
-        community = await community_manager.get_by_id(community_id)
-        possibleExchangers = set(community.users)
-        possibleExchangers.remove(user_id)
-        logging.info(f"possibleExchangers: {possibleExchangers}")
-
-        allExchanges = []
-        for pe in possibleExchangers:
-            exchanges = await exchange_manager.get_pending_exchanges_by_sender_id(pe)
-            allExchanges.extend(exchanges)
-
-        logging.info(f"allExchanges: {allExchanges}")
         user = await user_manager.get_by_id(user_id)
-
-        result = []
-        for exchange in allExchanges:
-            if user_id in exchange['blacklist_user_ids']:
-                continue
-            if not userHasStickersForExchange(user, exchange['stickers_to_receive']):
-                continue
-
-            result.append(exchange)
+        quantities = {s.id: s.quantity for s in user.stickers}
+        result = await exchange_manager.get_available_exchanges(
+            community_id, community['users'], user_id, quantities
+        )
 
         response_body = await render_fetch(result)
 
@@ -353,49 +317,34 @@ async def get_available_exchanges(
 
 
 async def render_fetch(exchanges: List[Dict]):
+    """
+        Replaces the stickers ids by the stickers and adds the sender of each exchange.
+        All the stickers and all the senders are read at once
+    """
     sticker_manager = await GetStickerManager()
     user_manager = await GetUserManager()
 
-    for exc in exchanges:
-        stickers_to_receive = []
-        stickers_to_give = []
-
-        for sr in exc['stickers_to_receive']:
-            sticker = await sticker_manager.get_by_id(sr)
-            stickers_to_receive.append(sticker)
+    sticker_ids = [
+        sid for exc in exchanges for sid in exc['stickers_to_receive'] + exc['stickers_to_give']
+    ]
+    sender_ids = [exc['sender_id'] for exc in exchanges]
+    stickers, senders = await asyncio.gather(
+        sticker_manager.get_by_ids(sticker_ids),
+        user_manager.get_user_summaries(sender_ids),
+    )
 
-        for sg in exc['stickers_to_give']:
-            sticker = await sticker_manager.get_by_id(sg)
-            stickers_to_give.append(sticker)
-
-        exc['stickers_to_receive'] = stickers_to_receive
-        exc['stickers_to_give'] = stickers_to_give
+    for exc in exchanges:
+        exc['stickers_to_receive'] = [stickers.get(sr) for sr in exc['stickers_to_receive']]
+        exc['stickers_to_give'] = [stickers.get(sg) for sg in exc['stickers_to_give']]
 
-        userModel = await user_manager.get_by_id(exc['sender_id'])
-        sender = userModel.dict()
-        sender['_id'] = exc['sender_id']
-        del sender['stickers']
-        del sender['id']
+        sender = senders.get(exc['sender_id'])
+        if sender is not None:
+            sender = sender.dict()
+            sender['_id'] = sender.pop('id')
         exc['sender'] = sender
 
     return exchanges
 
 
 def userHasStickersForExchange(user: UserModel, sticker_ids: List[str]) -> bool:
-    stickersFreq = {}
-    for sid in sticker_ids:
-        if sid not in stickersFreq:
-            stickersFreq[sid] = 1
-        else:
-            stickersFreq[sid] += 1
-
-    for sid in stickersFreq.keys():
-        found = False
-        for sticker in user.stickers:
-            if sticker.quantity >= stickersFreq[sid] and sid == sticker.id:
-                found = True
-
-        if not found:
-            return False
-
-    return True
+    return user.has_stickers(sticker_ids)
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, status
-from app.adapters.dtos.health import HealthStatusResponse
+from fastapi import APIRouter, Depends, status
+from app.adapters.dtos.health import HealthStatusResponse, PackagePoolMetricsResponse
+from app.db.impl.sticker_manager import StickerManager, GetStickerManager
 
 router = APIRouter(tags=["health"])
 
@@ -12,3 +13,15 @@ router = APIRouter(tags=["health"])
 )
 async def health():
     return HealthStatusResponse(status="UP")
+
+
+@router.get(
+    "/health/package-pool",
+    response_description="Get pre-built packages pool metrics",
+    response_model=PackagePoolMetricsResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def package_pool_metrics(
+        manager: StickerManager = Depends(GetStickerManager),
+):
+    return PackagePoolMetricsResponse(**manager.package_pool.metrics())
@@ -53,7 +53,7 @@ async def calculatePercentage(sticker_manager: StickerManager, stickers: List[Di
     packageCounter = await sticker_manager.get_package_counter()
 
     for s in stickers:
-        s['percentage'] = round(s['counter'] / packageCounter.counter * 100, 2)
+        s['percentage'] = round(s['counter'] / packageCounter.opened * 100, 2)
 
     return stickers
 
@@ -125,10 +125,12 @@ async def get_album_completion_report(
     status_code=status.HTTP_200_OK,
 )
 async def get_info(
+        start: Union[str, None] = None,
+        end: Union[str, None] = None,
         manager: UserManager = Depends(GetUserManager),
 ):
     try:
-        response = await manager.get_register_info()
+        response = await manager.get_register_info(start, end)
         return response
     except HTTPException as e:
         raise e
@@ -136,3 +138,21 @@ async def get_info(
         raise HTTPException(
             status_code=500, detail=f"Error getting Users Stats. {e}"
         )
+
+
+@router.post(
+    "/reports/registered-users/rebuild",
+    response_description="Recount the registered users by date from the users",
+    status_code=status.HTTP_200_OK,
+)
+async def rebuild_register_info(
+        manager: UserManager = Depends(GetUserManager),
+):
+    try:
+        await manager.rebuild_registrations_daily()
+        response = await manager.get_register_info()
+        return response
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error rebuilding Users Stats. {e}"
+        )
@@ -1,17 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
 from fastapi.params import Body
 from starlette import status
 from starlette.responses import JSONResponse
 
+from app.adapters.dtos.cursor_page import CursorPage
 from app.adapters.dtos.sticker_details import StickerDetailResponse
+from app.db.impl.cursor_pagination import InvalidCursorError
 from app.db import DatabaseManager, get_database
 from app.db.impl.sticker_manager import StickerManager, GetStickerManager
 from app.db.impl.user_manager import UserManager, GetUserManager
 from app.db.model.sticker import StickerModel, UpdateStickerModel
-from app.db.model.sticker_metrics import StickerMetricsModel
 from app.db.model.user_id import UserIdModel
-from typing import List
+from typing import List, Union
 from fastapi_pagination import Page
 
 
@@ -22,19 +23,29 @@ router = APIRouter(tags=["stickers"])
     "/stickers",
     response_description="Get all stickers",
     status_code=status.HTTP_200_OK,
-    response_model=Page[StickerModel],
+    response_model=Union[Page[StickerModel], CursorPage[StickerModel]],
+    description="With `cursor` the results are ordered by number and paginated by keyset "
+                "instead of by page: pass an empty cursor for the first page and then the "
+                "`next_cursor` of the previous page. `with_total` also counts all the results"
 )
 async def get_stickers(
     name: str = None,
     manager: StickerManager = Depends(GetStickerManager),
-    size: int = 50,
+    size: int = Query(50, gt=0),
     page: int = 1,
+    cursor: str = None,
+    with_total: bool = False,
 ):
     try:
-        response = await manager.get_all(name, size, page)
+        if cursor is not None:
+            response = await manager.get_all(name, size, cursor=cursor, with_total=with_total)
+        else:
+            response = await manager.get_all(name, size, page)
         return response
     except HTTPException as e:
         raise e
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error getting All Sticker. Exception {e}"
@@ -74,24 +85,23 @@ async def get_package(
     user_manager: UserManager = Depends(GetUserManager),
 ):
     try:
-        user = await user_manager.get_by_id(id=user_id.user_id)
-        if user.package_counter == 0:
+        # Checked before taking a package number, so that users without packages
+        # don't use up special package numbers
+        if not await user_manager.has_packages(user_id.user_id):
             raise HTTPException(
                 status_code=400,
                 detail=f"User {user_id.user_id} doesn't have any packages to open",
             )
 
         package = await manager.create_package()
-        # After create package open package and add to user myStickers
+        # After create package open package and add to user myStickers,
+        # this also takes the package from the user, or fails with 400 if it has none
         response = await user_manager.open_package(
             package=package, user_id=user_id.user_id
         )
-        # User updated with his new stickers
-        user_updated = await user_manager.get_by_id(id=user_id.user_id)
-        user_updated.package_counter -= 1
-        await user_manager.update(id=user_id.user_id, user=user_updated)
 
-        await updateStickerMetrics(manager, response)
+        # Metrics are written in background
+        manager.metrics_writer.record([s.id for s in response])
 
         return JSONResponse(
                 status_code=status.HTTP_201_CREATED,
@@ -105,27 +115,6 @@ async def get_package(
         )
 
 
-async def updateStickerMetrics(
-        sticker_manager: StickerManager,
-        stickers: List[StickerDetailResponse],
-):
-    result = []
-    for s in stickers:
-        stickerMetrics = await sticker_manager.get_sticker_metrics_by_sticker_id(s.id)
-        if stickerMetrics is not None:
-            stickerMetrics.counter += 1
-            await sticker_manager.update_sticker_metrics(stickerMetrics)
-            result.append(stickerMetrics)
-            continue
-
-        stickerMetrics = await sticker_manager.create_sticker_metrics(
-            StickerMetricsModel(sticker_id=s.id, counter=1)
-        )
-        result.append(stickerMetrics)
-
-    return result
-
-
 @router.post(
     "/stickers",
     response_description="Create new sticker",
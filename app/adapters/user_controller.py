@@ -1,10 +1,12 @@
-from fastapi import APIRouter, status, Depends, HTTPException, Body
-from fastapi.responses import JSONResponse
+import json
+from fastapi import APIRouter, status, Depends, HTTPException, Body, Query, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Dict, List
 
 from app.db import DatabaseManager, get_database
-from app.db.impl.user_manager import UserManager, GetUserManager
+from app.db.impl.user_manager import UserManager, GetUserManager, USER_FIELDS
 import logging
 from app.db.impl.sticker_manager import StickerManager
 from app.db.model.user import UserModel, UpdateUserModel
@@ -14,23 +16,51 @@ from app.firebase import FirebaseManager, GetFirebaseManager
 router = APIRouter(tags=["users"])
 
 
+async def stream_json_array(rows: AsyncIterator[Dict]):
+    yield "["
+    first = True
+    try:
+        async for row in rows:
+            yield json.dumps(row) if first else "," + json.dumps(row)
+            first = False
+    except Exception as e:
+        # The response already started, the client gets an incomplete array
+        logging.error(f"[LIST USERS] error streaming users: {e}")
+        return
+    yield "]"
+
+
 @router.get(
     "/users",
     response_description="Get a all users or get an user by mail",
     status_code=status.HTTP_200_OK,
+    description="Users are streamed ordered by id. To get the next page pass the id "
+                "of the last user as `after`. `fields` is a comma separated list of the "
+                "fields to return"
 )
 async def get_users(
         mail: str = None,
-        db: DatabaseManager = Depends(get_database),
+        after: str = None,
+        limit: int = Query(default=None, gt=0),
+        fields: str = None,
+        manager: UserManager = Depends(GetUserManager),
 ):
-    manager = UserManager(db.db)
     try:
         if mail is not None:
             logging.info(mail)
             response = await manager.get_user_by_mail(mail=mail)
             return response
-        response = await manager.get_all()
-        return response
+
+        projection = None
+        if fields is not None:
+            projection = [f.strip() for f in fields.split(",") if f.strip() != ""]
+            unknown = [f for f in projection if f not in USER_FIELDS]
+            if len(unknown) > 0:
+                raise HTTPException(
+                    status_code=400, detail=f"Unknown user fields: {unknown}"
+                )
+        rows = manager.iter_users(after=after, limit=limit, fields=projection)
+        return StreamingResponse(stream_json_array(rows), media_type="application/json")
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -39,6 +69,23 @@ async def get_users(
         )
 
 
+@router.post(
+    "/users/statistics/repair",
+    response_description="Recompute the stored statistics of every user",
+    status_code=status.HTTP_200_OK,
+)
+async def repair_statistics(
+        manager: UserManager = Depends(GetUserManager),
+):
+    try:
+        response = await manager.repair_statistics()
+        return response
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error repairing Users statistics. Exception {e}"
+        )
+
+
 @router.get(
     "/users/{user_id}",
     response_description="Get a user",
@@ -93,9 +140,7 @@ async def update(
         response = await manager.update(id=user_id, user=user)
         if response.is_profile_complete is False:
             if response.isProfileComplete():
-                response.is_profile_complete = True
-                response.package_counter += 3
-                response = await manager.update(id=user_id, user=response)
+                response = await manager.complete_profile(id=user_id)
 
         return response
     except HTTPException as e:
@@ -127,7 +172,8 @@ async def get_stickers(
         )
         if stickers is None:
             return []
-        ids = [s.id for s in stickers]
+        stickers_by_id = {s.id: s for s in stickers}
+        ids = list(stickers_by_id.keys())
         sticker_details = await sticker_manager.find_by_query(
             ids,
             country=country,
@@ -136,10 +182,10 @@ async def get_stickers(
 
         response = []
         for sticker_detail in sticker_details:
-            sticker = [s for s in stickers if s.id == sticker_detail["_id"]]
-            if len(sticker) != 0:
+            sticker = stickers_by_id.get(sticker_detail["_id"])
+            if sticker is not None:
                 sticker_response = StickerDetailResponse(
-                    **sticker[0].dict(),
+                    **sticker.dict(),
                     **sticker_detail
                 )
                 response.append(sticker_response)
@@ -178,37 +224,35 @@ async def paste_sticker(
         )
 
 
+async def notify_daily_packages(manager: UserManager, firebaseManager: FirebaseManager):
+    notified = 0
+    async for fcmToken in manager.iter_fcm_tokens():
+        try:
+            await run_in_threadpool(
+                firebaseManager.sendPush,
+                title="Reclama tus paquetes diarios!",
+                description="Anda a Inicio para reclamar tus paquetes diarios",
+                fcmToken=fcmToken,
+            )
+            notified += 1
+        except Exception as e:
+            logging.error(f"[DAILY PACKAGES] could not notify user: {e}")
+    logging.info(f"[DAILY PACKAGES] notified {notified} users")
+
+
 @router.put(
     "/users/packages/daily-package",
-    response_model=List[UserModel],
-    status_code=status.HTTP_200_OK,
-    description="Set the daily packages on True to all users"
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Notify the users that they can claim their daily packages. "
+                "Availability is reset every day without this call"
 )
 async def put_daily_package_availability(
+        background_tasks: BackgroundTasks,
         manager: UserManager = Depends(GetUserManager),
         firebaseManager: FirebaseManager = Depends(GetFirebaseManager),
 ):
-    try:
-        users = await manager.get_all()
-        users_updated = []
-        for user in users:
-            user.has_daily_packages_available = True
-            users_updated.append(user)
-            await manager.update(id=user.id, user=user)
-            if user.fcmToken != '':
-                firebaseManager.sendPush(
-                    title="Reclama tus paquetes diarios!",
-                    description="Anda a Inicio para reclamar tus paquetes diarios",
-                    fcmToken=user.fcmToken
-                )
-
-        return users_updated
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Could not get daily packages. Exception: {e}"
-        )
+    background_tasks.add_task(notify_daily_packages, manager, firebaseManager)
+    return {"detail": "Sending daily packages notifications"}
 
 
 @router.put(
@@ -222,14 +266,11 @@ async def put_daily_package(
         manager: UserManager = Depends(GetUserManager),
 ):
     try:
-        user = await manager.get_by_id(id=user_id)
-        if user.has_daily_packages_available is False:
+        user = await manager.claim_daily_packages(id=user_id)
+        if user is None:
             raise HTTPException(
                 status_code=400, detail=f"User {user_id} hasn't any packages available"
             )
-        user.has_daily_packages_available = False
-        user.package_counter += 2
-        await manager.update(id=user_id, user=user)
         return user
     except HTTPException as e:
         raise e
@@ -1,19 +1,118 @@
+import logging
+import re
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import Body
-from typing import Union
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from typing import Dict, List, Tuple, Union
+from app.adapters.dtos.community_details import UserNameResponse
 from app.db import DatabaseManager, get_database
+from app.db.impl.cursor_pagination import paginate_by_keys
+from app.db.impl.text_normalization import fold
 from app.db.model.community import CommunityModel, UpdateCommunityModel
 from fastapi.encoders import jsonable_encoder
 from fastapi_pagination.ext.motor import paginate
 from fastapi_pagination import Params
 
+MAX_USERS_PER_COMM = 11
+
+
+def name_key(name: str) -> str:
+    """
+        Stored next to the name as name_key, unique, so that names that only differ
+        in case, accents or spaces are the same community name
+    """
+    return fold(name)
+
+
+def name_prefix_query(name: str) -> dict:
+    return {"name_key": {"$regex": f"^{re.escape(name_key(name))}"}}
+
 
 class CommunityManager:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
 
+    async def ensure_indexes(self):
+        # Communities created before the name_key
+        operations = [
+            UpdateOne({"_id": comm["_id"]}, {"$set": {"name_key": name_key(comm["name"])}})
+            async for comm in self.db["communities"].find(
+                {"name_key": {"$exists": False}}, {"name": 1}
+            )
+        ]
+        if len(operations) > 0:
+            await self.db["communities"].bulk_write(operations, ordered=False)
+            logging.info(f"[COMMUNITIES] added name_key to {len(operations)} communities")
+        try:
+            await self.db["communities"].create_index("name_key", unique=True)
+        except DuplicateKeyError:
+            # Names are not unique until these communities are renamed
+            duplicates = await self.get_duplicate_names()
+            raise RuntimeError(
+                f"communities with the same name_key must be renamed: {duplicates}"
+            )
+
+    async def ensure_communities_count(self):
+        # Users from before communities_count was stored
+        if await self.db["users"].find_one({"communities_count": {"$exists": False}}) is not None:
+            await self.backfill_communities_count()
+
+    async def get_duplicate_names(self) -> Dict[str, List[str]]:
+        """
+            Ids of the communities sharing each name_key, for the name_keys shared by
+            more than one community
+        """
+        duplicates = await self.db["communities"].aggregate([
+            {"$group": {"_id": "$name_key", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ]).to_list(None)
+        return {d["_id"]: [str(i) for i in d["ids"]] for d in duplicates}
+
+    async def backfill_communities_count(self):
+        """
+            Sets the communities_count of every user from the members of the communities
+        """
+        await self.db["communities"].aggregate([
+            {"$project": {"users": {"$setUnion": ["$users", []]}}},
+            {"$unwind": "$users"},
+            {"$group": {"_id": "$users", "communities_count": {"$sum": 1}}},
+            {"$merge": {
+                "into": "users",
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard",
+            }},
+        ]).to_list(None)
+        await self.db["users"].update_many(
+            {"communities_count": {"$exists": False}},
+            {"$set": {"communities_count": 0}},
+        )
+
+    async def recount_communities(self, user_ids: List[str]):
+        """
+            Sets the communities_count of the given users from the communities they are in
+        """
+        if len(user_ids) == 0:
+            return
+        counts = await self.db["communities"].aggregate([
+            {"$match": {"users": {"$in": user_ids}}},
+            {"$project": {"users": {"$setIntersection": ["$users", user_ids]}}},
+            {"$unwind": "$users"},
+            {"$group": {"_id": "$users", "communities_count": {"$sum": 1}}},
+        ]).to_list(None)
+        counts_by_user = {c["_id"]: c["communities_count"] for c in counts}
+        await self.db["users"].bulk_write([
+            UpdateOne(
+                {"_id": user_id},
+                {"$set": {"communities_count": counts_by_user.get(user_id, 0)}},
+            )
+            for user_id in user_ids
+        ], ordered=False)
+
     async def get_communities(self, owners: [str], member: str, name: str, blocked: bool,
-                              size: int = 50, page: int = 0):
+                              size: int = 50, page: int = 0,
+                              cursor: str = None, with_total: bool = False):
         owners = list(filter(lambda o: o is not None, owners))
         query = {"$and": []}
         if owners is not None and len(owners) > 0:
@@ -21,19 +120,17 @@ class CommunityManager:
         if member is not None:
             query["$and"].append({"users": member})
         if name is not None:
-            query["$and"].append({"$or": [
-                {"name": name},
-                {"name": name.title()},
-                {"name": name.lower()},
-                {"name": {"$regex": name.title(), "$options": "i"}},
-                {"name": {"$regex": name.lower(), "$options": "i"}}
-            ]})
+            query["$and"].append(name_prefix_query(name))
         if blocked is not None:
             query["$and"].append({"is_blocked": blocked})
 
         if len(query["$and"]) == 0:
             query = {}
 
+        if cursor is not None:
+            return await paginate_by_keys(
+                self.db["communities"], query, ["_id"], size, cursor, with_total
+            )
         data = await paginate(self.db["communities"], query, Params(size=size, page=page))
         return data
 
@@ -42,14 +139,63 @@ class CommunityManager:
         comm_model = CommunityModel(**comm)
         return comm_model
 
+    async def get_with_members(
+            self, id: str
+    ) -> Union[Tuple[CommunityModel, List[UserNameResponse]], None]:
+        """
+            The community and the name, lastname and mail of its members, in the order
+            they joined, read in one aggregation
+        """
+        pipeline = [
+            {"$match": {"_id": id}},
+            {"$lookup": {
+                "from": "users",
+                "localField": "users",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"name": 1, "lastname": 1, "mail": 1}}],
+                "as": "members",
+            }},
+        ]
+        result = await self.db["communities"].aggregate(pipeline).to_list(1)
+        if len(result) == 0:
+            return None
+
+        comm = result[0]
+        # $lookup does not keep the order of the users
+        members_by_id = {m["_id"]: m for m in comm.pop("members")}
+        members = [
+            UserNameResponse(
+                id=user_id,
+                name=members_by_id[user_id]["name"],
+                lastname=members_by_id[user_id]["lastname"],
+                mail=members_by_id[user_id]["mail"],
+            )
+            for user_id in comm["users"] if user_id in members_by_id
+        ]
+        return CommunityModel(**comm), members
+
     async def add_new(self, community: CommunityModel = Body(...)):
+        """
+            Raises DuplicateKeyError if there is already a community with the name
+        """
         new = jsonable_encoder(community)
-        await self.db["communities"].insert_one(new)
+        await self.db["communities"].insert_one({**new, "name_key": name_key(new["name"])})
         return new
 
     async def update(self, id: str, community: UpdateCommunityModel = Body(...)):
         community = {k: v for k, v in community.dict().items() if v is not None}
-        await self.db["communities"].update_one({"_id": id}, {"$set": community})
+        if "name" in community:
+            community["name_key"] = name_key(community["name"])
+        if "users" in community:
+            # Members added or removed here did not go through their community slots
+            before = await self.db["communities"].find_one_and_update(
+                {"_id": id}, {"$set": community}, projection={"users": 1}
+            )
+            if before is not None:
+                changed = set(before.get("users", [])) ^ set(community["users"])
+                await self.recount_communities(sorted(changed))
+        else:
+            await self.db["communities"].update_one({"_id": id}, {"$set": community})
         model = await self.get_by_id(id)
         return model
 
@@ -61,16 +207,14 @@ class CommunityManager:
         comms = await self.db["communities"].find({"users": user_id}).to_list(5000)
         return comms
 
-    async def get_by_name(self, name: str):
-        query = {}
-        query["$or"] = [
-            {"name": name},
-            {"name": name.title()},
-            {"name": name.lower()},
-            {"name": {"$regex": name.title(), "$options": "i"}},
-            {"name": {"$regex": name.lower(), "$options": "i"}}
-        ]
-        comm = await self.db["communities"].find(query).to_list(5000)
+    async def get_by_name(self, name: str, limit: int = 50):
+        """
+            Communities whose name starts with the given one, ignoring case and accents
+        """
+        comm = await self.db["communities"] \
+            .find(name_prefix_query(name), {"name_key": 0}) \
+            .limit(limit) \
+            .to_list(limit)
         return comm
 
     async def get_blocked(self, blocked: bool):
@@ -81,11 +225,25 @@ class CommunityManager:
         comm = await self.db["communities"].find_one({"_id": community_id})
         return comm
 
-    async def join_community(self, community_id: str, user_id: str):
-        await self.db["communities"]. \
-            update_one({"_id": community_id}, {"$push": {"users": user_id}})
-        model = await self.get_community_by_id(community_id)
-        return model
+    async def join_community(self, community_id: str, user_id: str, password: str = None):
+        """
+            Adds the user to the community in one update, only if the password is right,
+            the community is not blocked nor full and the user is not a member yet.
+            Returns the updated community, or None if the user could not join
+        """
+        comm = await self.db["communities"].find_one_and_update(
+            {
+                "_id": community_id,
+                "password": password,
+                "is_blocked": {"$ne": True},
+                "users": {"$ne": user_id},
+                f"users.{MAX_USERS_PER_COMM - 1}": {"$exists": False},
+            },
+            {"$addToSet": {"users": user_id}},
+            projection={"name_key": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        return comm
 
 
 instance: Union[CommunityManager, None] = None
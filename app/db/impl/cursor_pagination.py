@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: List) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, keys: List[str]) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError(f"Invalid cursor {cursor}")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursorError(f"Invalid cursor {cursor}")
+    return values
+
+
+def after_query(keys: List[str], values: List) -> Dict:
+    """
+        Documents after the given values in the (keys) order, e.g. for number and _id:
+        number > n or (number == n and _id > id)
+    """
+    conditions = []
+    for i, key in enumerate(keys):
+        condition = {k: v for k, v in zip(keys[:i], values[:i])}
+        condition[key] = {"$gt": values[i]}
+        conditions.append(condition)
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+
+async def paginate_by_keys(
+        collection: AsyncIOMotorCollection,
+        query: Dict,
+        keys: List[str],
+        size: int,
+        cursor: str = "",
+        with_total: bool = False,
+) -> Dict:
+    """
+        Keyset pagination: a page is the first documents after the cursor ordered by
+        keys, which must identify a document, so every page costs the same. An empty
+        cursor is the first page. next_cursor is None on the last page
+    """
+    page_query = query
+    if cursor != "":
+        after = after_query(keys, decode_cursor(cursor, keys))
+        page_query = {"$and": [query, after]} if len(query) > 0 else after
+
+    # One more to know if there is a next page
+    items = await collection \
+        .find(page_query) \
+        .sort([(key, 1) for key in keys]) \
+        .limit(size + 1) \
+        .to_list(size + 1)
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor([items[-1][key] for key in keys])
+
+    total = await collection.count_documents(query) if with_total else None
+    return {"items": items, "size": size, "next_cursor": next_cursor, "total": total}
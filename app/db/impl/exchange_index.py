@@ -0,0 +1,132 @@
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Set
+
+# Indexes are rebuilt after this time, so exchanges changed by other workers are seen
+EXCHANGE_INDEX_TTL_SECONDS = 30
+
+
+class CommunityExchangeIndex:
+    """
+        Pending exchanges of the members of one community, indexed by the stickers they
+        ask for (stickers_to_receive)
+    """
+
+    def __init__(self, members: List[str], exchanges: List[Dict]):
+        self.members = set(members)
+        self.built_at = time.monotonic()
+        self.exchanges: Dict[str, Dict] = {}
+        self.by_sticker: Dict[str, Set[str]] = {}
+        # Exchanges that ask for no stickers can be accepted by anyone
+        self.asking_nothing: Set[str] = set()
+        for exchange in exchanges:
+            self.add(exchange)
+
+    def add(self, exchange: Dict):
+        exchange_id = str(exchange["_id"])
+        self.remove(exchange_id)
+        self.exchanges[exchange_id] = exchange
+        if len(exchange["stickers_to_receive"]) == 0:
+            self.asking_nothing.add(exchange_id)
+        for sticker_id in exchange["stickers_to_receive"]:
+            self.by_sticker.setdefault(sticker_id, set()).add(exchange_id)
+
+    def remove(self, exchange_id: str):
+        exchange = self.exchanges.pop(exchange_id, None)
+        if exchange is None:
+            return
+        self.asking_nothing.discard(exchange_id)
+        for sticker_id in exchange["stickers_to_receive"]:
+            exchange_ids = self.by_sticker.get(sticker_id)
+            if exchange_ids is None:
+                continue
+            exchange_ids.discard(exchange_id)
+            if len(exchange_ids) == 0:
+                del self.by_sticker[sticker_id]
+
+    def available_for(self, user_id: str, quantities: Dict[str, int]) -> List[Dict]:
+        """
+            Exchanges of the other members that the user can accept, given how many
+            copies of each sticker the user has. Only the exchanges asking for stickers
+            the user has are looked at
+        """
+        matches = Counter({exchange_id: 0 for exchange_id in self.asking_nothing})
+        for sticker_id, quantity in quantities.items():
+            if quantity > 0:
+                matches.update(self.by_sticker.get(sticker_id, ()))
+
+        result = []
+        for exchange_id, matched in matches.items():
+            exchange = self.exchanges[exchange_id]
+            wanted = Counter(exchange["stickers_to_receive"])
+            if matched != len(wanted):
+                continue
+            if exchange["sender_id"] == user_id:
+                continue
+            if user_id in exchange.get("blacklist_user_ids", []):
+                continue
+            if any(quantities.get(s, 0) < amount for s, amount in wanted.items()):
+                continue
+            # Callers can change the exchanges they get without changing the index
+            result.append(dict(exchange))
+        result.sort(key=lambda e: str(e["_id"]))
+        return result
+
+
+class ExchangeIndex:
+    """
+        In-process CommunityExchangeIndex of each community, built on the first request
+        and kept up to date with the exchanges created and updated by this process
+    """
+
+    def __init__(self, ttl: float = EXCHANGE_INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self.communities: Dict[str, CommunityExchangeIndex] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_fresh(self, index: CommunityExchangeIndex, members: List[str]) -> bool:
+        return index.members == set(members) and time.monotonic() - index.built_at <= self.ttl
+
+    async def get(
+            self,
+            community_id: str,
+            members: List[str],
+            load: Callable[[List[str]], Awaitable[List[Dict]]],
+    ) -> CommunityExchangeIndex:
+        """
+            Index of the community, rebuilt with the pending exchanges returned by load
+            if there is none, it expired or the members changed
+        """
+        index = self.communities.get(community_id)
+        if index is not None and self.is_fresh(index, members):
+            self.hits += 1
+            return index
+
+        self.misses += 1
+        exchanges = await load(members)
+        index = CommunityExchangeIndex(members, exchanges)
+        self.communities = {
+            cid: i for cid, i in self.communities.items()
+            if time.monotonic() - i.built_at <= self.ttl
+        }
+        self.communities[community_id] = index
+        return index
+
+    def exchange_created(self, exchange: Dict):
+        for index in self.communities.values():
+            if exchange["sender_id"] in index.members:
+                index.add(exchange)
+
+    def exchange_updated(self, exchange: Dict):
+        exchange_id = str(exchange["_id"])
+        for index in self.communities.values():
+            if exchange_id not in index.exchanges:
+                continue
+            if exchange["completed"] is True:
+                index.remove(exchange_id)
+            else:
+                index.add(exchange)
+
+
+exchange_index = ExchangeIndex()
@@ -1,5 +1,6 @@
-from typing import Union
+from typing import Dict, List, Union
 
+from app.db.impl.exchange_index import ExchangeIndex, exchange_index
 from app.db.model.exchange import ExchangeModel, UpdateExchangeModel
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import Body
@@ -8,8 +9,12 @@ from app.db import DatabaseManager, get_database
 
 
 class ExchangeManager:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, index: ExchangeIndex = exchange_index):
         self.db = db
+        self.index = index
+
+    async def ensure_indexes(self):
+        await self.db["exchanges"].create_index([("sender_id", 1), ("completed", 1)])
 
     async def get_pending_exchanges_by_sender_id(self, sender_id: str):
         pendingExchanges = await self.db["exchanges"].\
@@ -17,6 +22,25 @@ class ExchangeManager:
             to_list(10)  # Max amount of exchanges per user is 3
         return pendingExchanges
 
+    async def get_pending_exchanges_by_senders(self, sender_ids: List[str]) -> List[Dict]:
+        # Bounded by the members and their pending exchanges, read through the index
+        pendingExchanges = await self.db["exchanges"].find(
+            {"sender_id": {"$in": sender_ids}, "completed": False},
+            {'id': 0},
+        ).to_list(None)
+        return pendingExchanges
+
+    async def get_available_exchanges(self, community_id: str, members: List[str],
+                                      user_id: str, quantities: Dict[str, int]) -> List[Dict]:
+        """
+            Pending exchanges of the other members of the community that the user can
+            accept with the given quantity of each sticker
+        """
+        index = await self.index.get(
+            community_id, members, self.get_pending_exchanges_by_senders
+        )
+        return index.available_for(user_id, quantities)
+
     async def get_exchange_by_id(self, id: str):
         exchange = await self.db["exchanges"].find_one({"_id": id})
         return ExchangeModel(**exchange)
@@ -32,12 +56,14 @@ class ExchangeManager:
     async def add_new(self, exchange: ExchangeModel = Body(...)):
         new = jsonable_encoder(exchange)
         await self.db["exchanges"].insert_one(new)
+        self.index.exchange_created(dict(new))
         return new
 
     async def update(self, id: str, exchange: UpdateExchangeModel = Body(...)):
         exchange = {k: v for k, v in exchange.dict().items() if v is not None}
         await self.db["exchanges"].update_one({"_id": id}, {"$set": exchange})
         model = await self.get_exchange_by_id(id)
+        self.index.exchange_updated(jsonable_encoder(model))
         return model
 
 
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import Union
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+# Amount of package numbers reserved on each round trip. Being 11, every block has
+# one special number, which is lost with the rest of the block if the worker stops
+# before reaching it
+PACKAGE_COUNTER_BLOCK_SIZE = 11
+
+
+class PackageCounterAllocator:
+    """
+        Hands out package numbers using the hi/lo pattern: blocks of consecutive numbers
+        are reserved with an atomic $inc on the package-counter document, and then used
+        locally. Each number is used at most once across all workers.
+        The counter is the highest reserved number, not the amount of opened packages,
+        which is kept apart as opened by the StickerMetricsWriter.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, block_size: int = PACKAGE_COUNTER_BLOCK_SIZE):
+        self.db = db
+        self.block_size = block_size
+        self.next = 0
+        self.limit = 0
+        self._lock: Union[asyncio.Lock, None] = None
+
+    async def reserve_block(self):
+        package_counter = await self.db["package-counter"].find_one_and_update(
+            {},
+            {"$inc": {"counter": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.limit = package_counter["counter"]
+        self.next = self.limit - self.block_size
+        logging.info(f"[PACKAGE COUNTER] reserved [{self.next}, {self.limit})")
+
+    async def allocate(self) -> int:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        while self.next >= self.limit:
+            async with self._lock:
+                if self.next >= self.limit:
+                    await self.reserve_block()
+        number = self.next
+        self.next += 1
+        return number
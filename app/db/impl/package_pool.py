@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Tuple, Union
+
+from app.db.impl.sticker_catalog import StickerCatalog
+from app.db.model.package import PackageModel
+
+# A pool is refilled up to its high watermark once it goes below its low watermark.
+# Special packages are 1 out of 11, so their pool is smaller
+POOL_LOW_WATERMARK = 20
+POOL_HIGH_WATERMARK = 100
+SPECIAL_POOL_LOW_WATERMARK = 2
+SPECIAL_POOL_HIGH_WATERMARK = 10
+POOL_REFILL_INTERVAL_SECONDS = 5
+
+
+class PackagePool:
+    """
+        Bounded pools of pre-built normal and special packages, kept topped up by a
+        background task. If a pool is empty the package is built on the request.
+    """
+
+    def __init__(
+            self,
+            builder: Callable[[bool], Awaitable[PackageModel]],
+            catalog: StickerCatalog,
+            low_watermark: int = POOL_LOW_WATERMARK,
+            high_watermark: int = POOL_HIGH_WATERMARK,
+            special_low_watermark: int = SPECIAL_POOL_LOW_WATERMARK,
+            special_high_watermark: int = SPECIAL_POOL_HIGH_WATERMARK,
+            refill_interval: float = POOL_REFILL_INTERVAL_SECONDS,
+    ):
+        self.builder = builder
+        self.catalog = catalog
+        self.refill_interval = refill_interval
+        self.watermarks = {
+            False: (low_watermark, high_watermark),
+            True: (special_low_watermark, special_high_watermark),
+        }
+        # Packages are stored with the catalog version they were built from
+        self.pools: Dict[bool, Deque[Tuple[int, PackageModel]]] = {
+            False: deque(),
+            True: deque(),
+        }
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.discarded = 0
+        self.refills = 0
+        self.errors = 0
+        self._task: Union[asyncio.Task, None] = None
+        self._wakeup: Union[asyncio.Event, None] = None
+
+    def size(self, special: bool) -> int:
+        return len(self.pools[special])
+
+    async def get(self, special: bool) -> PackageModel:
+        pool = self.pools[special]
+        while len(pool) > 0:
+            version, package = pool.popleft()
+            if version != self.catalog.version:
+                self.discarded += 1
+                continue
+            self.hits += 1
+            if len(pool) < self.watermarks[special][0]:
+                self._wake_up()
+            return package
+
+        self.misses += 1
+        self._wake_up()
+        return await self.builder(special)
+
+    def discard_stale(self):
+        for special, pool in self.pools.items():
+            fresh = [p for p in pool if p[0] == self.catalog.version]
+            self.discarded += len(pool) - len(fresh)
+            self.pools[special] = deque(fresh)
+
+    async def refill(self):
+        self.discard_stale()
+        for special, pool in self.pools.items():
+            low, high = self.watermarks[special]
+            if len(pool) >= low:
+                continue
+
+            self.refills += 1
+            while len(pool) < high:
+                version = self.catalog.version
+                package = await self.builder(special)
+                pool.append((version, package))
+                self.generated += 1
+                # Let requests run between packages
+                await asyncio.sleep(0)
+
+    async def run(self):
+        while True:
+            # Wake-ups that arrive while refilling are kept for the next wait
+            self._wakeup.clear()
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"[PACKAGE POOL] error refilling pool: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self.run())
+        logging.info("[PACKAGE POOL] started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logging.info("[PACKAGE POOL] stopped")
+
+    def _wake_up(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def metrics(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "normal_size": self.size(False),
+            "special_size": self.size(True),
+            "normal_watermarks": list(self.watermarks[False]),
+            "special_watermarks": list(self.watermarks[True]),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "discarded": self.discarded,
+            "refills": self.refills,
+            "errors": self.errors,
+        }
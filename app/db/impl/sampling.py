@@ -0,0 +1,28 @@
+import random
+from typing import List, Sequence, TypeVar, Union
+
+T = TypeVar("T")
+
+
+def sample_positions(population_size: int, amount: int,
+                     rng: Union[random.Random, None] = None) -> List[int]:
+    """
+        Draw up to `amount` different positions in [0, population_size) without replacement.
+        It is a partial Fisher-Yates shuffle that only keeps track of the swapped positions,
+        so it runs in O(amount) time and memory whatever the size of the population.
+        Every ordered selection is equally likely, as with successive uniform draws.
+    """
+    rng = rng or random
+    amount = min(amount, population_size)
+    swapped = {}
+    positions = []
+    for i in range(amount):
+        j = rng.randrange(i, population_size)
+        positions.append(swapped.get(j, j))
+        swapped[j] = swapped.get(i, i)
+    return positions
+
+
+def sample_without_replacement(items: Sequence[T], amount: int,
+                               rng: Union[random.Random, None] = None) -> List[T]:
+    return [items[pos] for pos in sample_positions(len(items), amount, rng)]
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Union
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.db.impl.sampling import sample_positions
+from app.db.impl.sticker_search_index import StickerSearchIndex
+from app.db.model.sticker import StickerModel
+
+# The catalog is reloaded after this amount of seconds even if this process did not
+# change it, so stickers created or updated through another worker are eventually seen
+CATALOG_TTL_SECONDS = 300
+
+
+class StickerCatalog:
+    """
+        Process-local copy of the stickers collection bucketed by weight.
+        Packages are sampled from here so opening one doesn't read the stickers collection,
+        and stickers are searched by name with its search index.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL_SECONDS,
+                 rng: Union[random.Random, None] = None):
+        self.ttl = ttl
+        self.rng = rng
+        self.version = 0
+        self.loaded_version: Union[int, None] = None
+        self.loaded_at = 0.
+        self.stickers: Dict[str, dict] = {}
+        self.buckets: Dict[int, List[StickerModel]] = {}
+        self.search_index = StickerSearchIndex()
+        self._lock: Union[asyncio.Lock, None] = None
+
+    def invalidate(self):
+        """
+            Must be called whenever the stickers collection changes
+        """
+        self.version += 1
+
+    def is_stale(self) -> bool:
+        if self.loaded_version != self.version:
+            return True
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    def build(self, stickers: List[dict]):
+        by_id = {}
+        buckets: Dict[int, List[StickerModel]] = {}
+        search_index = StickerSearchIndex()
+        for sticker in stickers:
+            model = StickerModel(**sticker)
+            by_id[str(sticker["_id"])] = sticker
+            buckets.setdefault(model.weight, []).append(model)
+            search_index.add(str(sticker["_id"]), model.name)
+
+        self.stickers = by_id
+        self.buckets = buckets
+        self.search_index = search_index
+
+    async def load(self, db: AsyncIOMotorDatabase):
+        version = self.version
+        stickers = await db["stickers"].find().to_list(None)
+        self.build(stickers)
+        self.loaded_version = version
+        self.loaded_at = time.monotonic()
+        logging.info(f"[STICKER CATALOG] loaded {len(stickers)} stickers, version {version}")
+
+    async def ensure_loaded(self, db: AsyncIOMotorDatabase):
+        if not self.is_stale():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have reloaded it while we were waiting
+            if self.is_stale():
+                await self.load(db)
+
+    def bucket(self, weight: int) -> List[StickerModel]:
+        return self.buckets.get(weight, [])
+
+    def sample(self, weights: Iterable[int], amount: int) -> List[StickerModel]:
+        """
+            Select up to `amount` different stickers uniformly from the union of the
+            buckets of the given weights, without concatenating them.
+        """
+        buckets = [self.bucket(w) for w in weights]
+        buckets = [b for b in buckets if len(b) > 0]
+
+        offsets = []
+        total = 0
+        for b in buckets:
+            offsets.append(total)
+            total += len(b)
+
+        positions = sample_positions(total, amount, self.rng)
+
+        result = []
+        for pos in positions:
+            i = bisect_right(offsets, pos) - 1
+            result.append(buckets[i][pos - offsets[i]])
+        return result
+
+
+catalog = StickerCatalog()
@@ -1,81 +1,111 @@
 import logging
-from random import choice
 
 from fastapi import Body
 from fastapi.encoders import jsonable_encoder
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import Union
 from app.db import DatabaseManager, get_database
-from app.db.impl.user_manager import TOTAL_STICKERS_ALBUM
+from app.db.impl.cursor_pagination import paginate_by_keys
+from app.db.impl.package_counter_allocator import PackageCounterAllocator
+from app.db.impl.package_pool import PackagePool
+from app.db.impl.sticker_catalog import StickerCatalog, catalog as sticker_catalog
+from app.db.impl.sticker_metrics_writer import StickerMetricsWriter, STICKERS_METRICS_REPORT
 
 from app.db.model.package import PackageModel
 from app.db.model.package_counter import PackageCounterModel
 from app.db.model.sticker import StickerModel, UpdateStickerModel
-from app.db.model.sticker_metrics import StickerMetricsModel
 from typing import List, Dict
 from fastapi_pagination.ext.motor import paginate
 from fastapi_pagination import Params
 
 
-def get_random_stickers_from_list(sticker_list: List[StickerModel],
-                                  amount_of_stickers_desired: int):
-    random_sticker_list = []
-    amount_of_stickers_to_return = min(amount_of_stickers_desired, len(sticker_list))
-    positions_stickers_added = []
-
-    for i in range(amount_of_stickers_to_return):
-        random_pos = choice(
-            [number for number in range(0, len(sticker_list))
-             if number not in positions_stickers_added]
-        )
-        random_sticker_list.append(sticker_list[random_pos])
-        positions_stickers_added.append(random_pos)
-
-    return random_sticker_list
-
-
 class StickerManager:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, catalog: StickerCatalog = sticker_catalog):
         self.db = db
+        self.catalog = catalog
+        self.package_pool = PackagePool(self.build_package, catalog)
+        self.package_counter = PackageCounterAllocator(db)
+        self.metrics_writer = StickerMetricsWriter(db, catalog)
+
+    async def ensure_indexes(self):
+        await self.db["stickers_metrics"].create_index("sticker_id", unique=True)
+        await self.db[STICKERS_METRICS_REPORT].create_index("counter")
+        await self.db["stickers"].create_index([("number", 1), ("_id", 1)])
+        # Opened packages were the counter until numbers were reserved in blocks
+        await self.db["package-counter"].update_one(
+            {"opened": {"$exists": False}}, [{"$set": {"opened": "$counter"}}]
+        )
+        # Backfill the report the first time
+        if await self.db[STICKERS_METRICS_REPORT].estimated_document_count() == 0:
+            await self.rebuild_sticker_metrics_report()
 
     async def get_by_id(self, id: str):
         sticker = await self.db["stickers"].find_one({"_id": id})
         return sticker
 
-    async def get_all(self, name: str = None, size: int = 50, page: int = 0):
+    async def get_by_ids(self, ids: List[str]) -> Dict[str, dict]:
+        """
+            Stickers by id, taken from the catalog if it is fresh and with one query
+            for the ones missing. Stickers that do not exist are left out
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        found = {}
+        if not self.catalog.is_stale():
+            found = {sid: dict(self.catalog.stickers[sid])
+                     for sid in unique_ids if sid in self.catalog.stickers}
+        missing = [sid for sid in unique_ids if sid not in found]
+        if len(missing) > 0:
+            stickers = await self.db["stickers"] \
+                .find({"_id": {"$in": missing}}) \
+                .to_list(len(missing))
+            for sticker in stickers:
+                found[str(sticker["_id"])] = sticker
+        return found
+
+    async def get_all(self, name: str = None, size: int = 50, page: int = 0,
+                      cursor: str = None, with_total: bool = False):
+        """
+            Page of stickers. With a cursor (empty for the first page) the stickers are
+            ordered by number and paginated by keyset instead of page number
+        """
         query = {}
         if name is not None:
-            query["$or"] = [
-                {"name": name.title()},
-                {"name": {"$regex": name.title(), "$options": "i"}}
-            ]
+            query["_id"] = {"$in": await self.search_by_name(name)}
 
+        if cursor is not None:
+            return await paginate_by_keys(
+                self.db["stickers"], query, ["number", "_id"], size, cursor, with_total
+            )
         stickers = await paginate(self.db["stickers"], query, params=Params(size=size, page=page))
         return stickers
 
+    async def search_by_name(self, name: str) -> List[str]:
+        await self.catalog.ensure_loaded(self.db)
+        return self.catalog.search_index.search(name)
+
     async def create_sticker(self, sticker: StickerModel = Body(...)):
         new = jsonable_encoder(sticker)
         await self.db["stickers"].insert_one(new)
+        self.catalog.invalidate()
         return new
 
-    async def create_sticker_metrics(self, stickerMetrics: StickerMetricsModel):
-        new = jsonable_encoder(stickerMetrics)
-        await self.db["stickers_metrics"].insert_one(new)
-        return new
-
-    async def get_sticker_metrics_by_sticker_id(
-            self,
-            sticker_id: str) -> Union[StickerMetricsModel, None]:
-        stickerMetric = await self.db["stickers_metrics"]. \
-            find_one({"sticker_id": sticker_id})
-        if stickerMetric is None:
-            return None
+    async def get_sticker_metrics_freq(self, top5: bool) -> List[Dict]:
+        """
+            Reads the materialized report, which is kept up to date by the metrics writer
+        """
+        cursor = self.db[STICKERS_METRICS_REPORT].find(
+            {"name": {"$exists": True}},
+            {"_id": 0, "name": 1, "number": 1, "country": 1, "counter": 1},
+        ).sort("counter", 1)
+        if top5 is True:
+            cursor = cursor.limit(5)
 
-        return StickerMetricsModel(**stickerMetric)
+        return await cursor.to_list(None)
 
-    async def get_sticker_metrics_freq(self, top5: bool) -> List[Dict]:
-        sort = {'$sort': {'counter': 1}}
-        limit = {'$limit': 5}
+    async def rebuild_sticker_metrics_report(self):
+        """
+            Rebuilds the whole materialized report from stickers_metrics
+        """
         merge = {'$lookup': {
             'from': 'stickers',
             'localField': 'sticker_id',
@@ -84,30 +114,24 @@ class StickerManager:
         }}
         unwind = {'$unwind': {'path': '$metadata'}}
         project = {'$project': {
-            '_id': 0,
+            '_id': '$sticker_id',
             'name': '$metadata.name',
             'number': '$metadata.number',
             'country': '$metadata.country',
             'counter': 1
         }}
+        out = {'$out': STICKERS_METRICS_REPORT}
 
-        pipeline = [sort]
-        if top5 is True:
-            pipeline = [*pipeline, limit]
-
-        pipeline = [*pipeline, merge, unwind, project]
-
-        return await self.db["stickers_metrics"]. \
-            aggregate(pipeline).to_list(10000)
-
-    async def update_sticker_metrics(self, stickerMetrics: StickerMetricsModel):
-        payload = {k: v for k, v in stickerMetrics.dict().items() if v is not None}
-        await self.db["stickers_metrics"]. \
-            update_one({"sticker_id": stickerMetrics.sticker_id}, {"$set": payload})
+        await self.db["stickers_metrics"].aggregate([merge, unwind, project, out]).to_list(None)
 
     async def update(self, id: str, sticker: UpdateStickerModel = Body(...)):
         sticker = {k: v for k, v in sticker.dict().items() if v is not None}
         await self.db["stickers"].update_one({"_id": id}, {"$set": sticker})
+        self.catalog.invalidate()
+        if "name" in sticker:
+            await self.db[STICKERS_METRICS_REPORT].update_one(
+                {"_id": id}, {"$set": {"name": sticker["name"]}}
+            )
         model = await self.get_by_id(id)
         return model
 
@@ -117,144 +141,14 @@ class StickerManager:
 
     async def create_package(self):
         try:
-            package_counter = await self.db["package-counter"].find_one()
-            package_counter_model = PackageCounterModel(**package_counter)
-            package_amount = package_counter_model.counter
-
-            # We get all the stickers whose weight is between 1 and 3
-            stickers_with_weight_1 = await self.db["stickers"].find({"weight": 1}). \
-                to_list(TOTAL_STICKERS_ALBUM)
-            stickers_with_weight_2 = await self.db["stickers"].find({"weight": 2}). \
-                to_list(TOTAL_STICKERS_ALBUM)
-            stickers_with_weight_3 = await self.db["stickers"].find({"weight": 3}). \
-                to_list(TOTAL_STICKERS_ALBUM)
-
-            # If it is a normal package, we need 5 stickers whose weight is between 1 and 3
-            if (package_amount % 11 != 0) or (package_amount == 0):
-
-                # Select 5 random ones stickers whose weight is between 1 and 3
-                stickers_in_package = get_random_stickers_from_list(
-                    stickers_with_weight_1 +
-                    stickers_with_weight_2 +
-                    stickers_with_weight_3,
-                    5)
-
-                # Some variables that will help us with the amount of stickers check
-                next_sticker_weight_to_add = 4
-                stickers_remaining = []
-                stickers_up_to_now = stickers_in_package
-
-                # If the amount of stickers with weight between 1 and 3 is less than 5,
-                # we will be adding stickers with higher weights to the package
-                while len(stickers_up_to_now) < 5 and next_sticker_weight_to_add < 6:
-                    stickers_remaining = await self.db["stickers"]. \
-                        find({"weight": {"$gte": 4, "$lte": next_sticker_weight_to_add}}) \
-                        .to_list(TOTAL_STICKERS_ALBUM)
-                    stickers_remaining = get_random_stickers_from_list(
-                        stickers_remaining,
-                        5 - len(stickers_in_package)
-                    )
-                    next_sticker_weight_to_add += 1
-                    stickers_up_to_now = stickers_in_package + stickers_remaining
-
-                stickers_in_package = stickers_in_package + stickers_remaining
-
-                if len(stickers_in_package) < 5:
-                    raise Exception("No stickers at the moment to create a package")
-            else:
-                # If it is a "special package", we need:
-                # 1 sticker with weight 5
-                # 2 stickers with weight 1
-                # 2 stickers with weight between 2 and 4
-
-                # Get the remaining stickers lists that we will use
-                stickers_with_weight_4 = await self.db["stickers"].find({"weight": 4}) \
-                    .to_list(TOTAL_STICKERS_ALBUM)
-                stickers_with_weight_5 = await self.db["stickers"].find({"weight": 5}) \
-                    .to_list(TOTAL_STICKERS_ALBUM)
-
-                # Search for a sticker with weight 5
-                difficult_sticker = get_random_stickers_from_list(stickers_with_weight_5, 1)
-
-                # Variable that will help with the amount of stickers check
-                next_sticker_weight_to_add = 4
-
-                # If there is no sticker with weight 5, we search one with a lower weight
-                while len(difficult_sticker) < 1 and next_sticker_weight_to_add > 0:
-                    difficult_sticker = await self.db["stickers"].find(
-                        {"weight": next_sticker_weight_to_add}) \
-                        .to_list(1)
-                    next_sticker_weight_to_add -= 1
-
-                if len(difficult_sticker) < 1:
-                    raise Exception("No stickers at the moment to create a package")
-
-                # Select two stickers with weight 1
-                easy_stickers = get_random_stickers_from_list(stickers_with_weight_1, 2)
-
-                # Variables that will help with the amount of stickers check
-                easy_stickers_remaining = []
-                easy_stickers_up_to_now = easy_stickers
-                next_sticker_weight_to_add = 2
-
-                # If the amount of stickers with weight 1 is less than 2,
-                # we search for stickers with higher weight
-                while len(easy_stickers_up_to_now) < 2 and next_sticker_weight_to_add < 6:
-                    easy_stickers_remaining = await self.db["stickers"].find(
-                        {"weight": next_sticker_weight_to_add}) \
-                        .to_list(TOTAL_STICKERS_ALBUM)
-                    easy_stickers_remaining = get_random_stickers_from_list(
-                        easy_stickers_remaining,
-                        2 - len(easy_stickers)
-                    )
-                    next_sticker_weight_to_add += 1
-                    easy_stickers_up_to_now = easy_stickers_up_to_now + easy_stickers_remaining
-
-                easy_stickers = easy_stickers + easy_stickers_remaining
-
-                if len(easy_stickers) < 2:
-                    raise Exception("No stickers at the moment to create a package")
-
-                # We search for 2 stickers with weight between 2 and 4
-                medium_stickers = get_random_stickers_from_list(
-                    stickers_with_weight_2 +
-                    stickers_with_weight_3 +
-                    stickers_with_weight_4,
-                    2)
-
-                # If the amount of stickers with weight between 2 and 4 is less than 2,
-                # we search for stickers with weight 1
-                if len(medium_stickers) < 2:
-                    remaining_medium_stickers = get_random_stickers_from_list(
-                        stickers_with_weight_1,
-                        2 - len(medium_stickers)
-                    )
-                    medium_stickers = medium_stickers + remaining_medium_stickers
-
-                # If the amount of stickers with weight between 1 and 4 is less than 2,
-                # we search for stickers with weight 5
-                if len(medium_stickers) < 2:
-                    remaining_medium_stickers = get_random_stickers_from_list(
-                        stickers_with_weight_5,
-                        2 - len(medium_stickers)
-                    )
-                    medium_stickers = medium_stickers + remaining_medium_stickers
-
-                if len(medium_stickers) < 2:
-                    raise Exception("No stickers at the moment to create a package")
-
-                stickers_in_package = difficult_sticker + easy_stickers + medium_stickers
-
-                # Check for duplicates
-                id_list = []
-                for sticker in stickers_in_package:
-                    if sticker['_id'] not in id_list:
-                        id_list.append(sticker['_id'])
-                if len(id_list) < 5:
-                    raise Exception("No stickers at the moment to create a package")
-
-            package = PackageModel(stickers=stickers_in_package)
-            await self.db["package-counter"].update_one({}, {"$inc": {"counter": 1}})
+            # Package numbers are reserved in blocks, so usually this doesn't hit the db
+            package_number = await self.package_counter.allocate()
+
+            # Every 11 packages there is a "special" one
+            special = (package_number % 11 == 0) and (package_number != 0)
+
+            # Packages are pre-built in background, it is only built here if the pool is empty
+            package = await self.package_pool.get(special)
             return package
 
         except Exception as e:
@@ -262,20 +156,127 @@ class StickerManager:
             logging.error(msg)
             raise RuntimeError(msg)
 
+    async def build_package(self, special: bool) -> PackageModel:
+        # Stickers are sampled from the in-memory catalog, bucketed by weight
+        await self.catalog.ensure_loaded(self.db)
+        catalog = self.catalog
+
+        # If it is a normal package, we need 5 stickers whose weight is between 1 and 3
+        if not special:
+
+            # Select 5 random ones stickers whose weight is between 1 and 3
+            stickers_in_package = catalog.sample([1, 2, 3], 5)
+
+            # Some variables that will help us with the amount of stickers check
+            next_sticker_weight_to_add = 4
+            stickers_remaining = []
+            stickers_up_to_now = stickers_in_package
+
+            # If the amount of stickers with weight between 1 and 3 is less than 5,
+            # we will be adding stickers with higher weights to the package
+            while len(stickers_up_to_now) < 5 and next_sticker_weight_to_add < 6:
+                stickers_remaining = catalog.sample(
+                    range(4, next_sticker_weight_to_add + 1),
+                    5 - len(stickers_in_package)
+                )
+                next_sticker_weight_to_add += 1
+                stickers_up_to_now = stickers_in_package + stickers_remaining
+
+            stickers_in_package = stickers_in_package + stickers_remaining
+
+            if len(stickers_in_package) < 5:
+                raise Exception("No stickers at the moment to create a package")
+        else:
+            # If it is a "special package", we need:
+            # 1 sticker with weight 5
+            # 2 stickers with weight 1
+            # 2 stickers with weight between 2 and 4
+
+            # Search for a sticker with weight 5
+            difficult_sticker = catalog.sample([5], 1)
+
+            # Variable that will help with the amount of stickers check
+            next_sticker_weight_to_add = 4
+
+            # If there is no sticker with weight 5, we search one with a lower weight
+            while len(difficult_sticker) < 1 and next_sticker_weight_to_add > 0:
+                difficult_sticker = catalog.bucket(next_sticker_weight_to_add)[:1]
+                next_sticker_weight_to_add -= 1
+
+            if len(difficult_sticker) < 1:
+                raise Exception("No stickers at the moment to create a package")
+
+            # Select two stickers with weight 1
+            easy_stickers = catalog.sample([1], 2)
+
+            # Variables that will help with the amount of stickers check
+            easy_stickers_remaining = []
+            easy_stickers_up_to_now = easy_stickers
+            next_sticker_weight_to_add = 2
+
+            # If the amount of stickers with weight 1 is less than 2,
+            # we search for stickers with higher weight
+            while len(easy_stickers_up_to_now) < 2 and next_sticker_weight_to_add < 6:
+                easy_stickers_remaining = catalog.sample(
+                    [next_sticker_weight_to_add],
+                    2 - len(easy_stickers)
+                )
+                next_sticker_weight_to_add += 1
+                easy_stickers_up_to_now = easy_stickers_up_to_now + easy_stickers_remaining
+
+            easy_stickers = easy_stickers + easy_stickers_remaining
+
+            if len(easy_stickers) < 2:
+                raise Exception("No stickers at the moment to create a package")
+
+            # We search for 2 stickers with weight between 2 and 4
+            medium_stickers = catalog.sample([2, 3, 4], 2)
+
+            # If the amount of stickers with weight between 2 and 4 is less than 2,
+            # we search for stickers with weight 1
+            if len(medium_stickers) < 2:
+                remaining_medium_stickers = catalog.sample(
+                    [1],
+                    2 - len(medium_stickers)
+                )
+                medium_stickers = medium_stickers + remaining_medium_stickers
+
+            # If the amount of stickers with weight between 1 and 4 is less than 2,
+            # we search for stickers with weight 5
+            if len(medium_stickers) < 2:
+                remaining_medium_stickers = catalog.sample(
+                    [5],
+                    2 - len(medium_stickers)
+                )
+                medium_stickers = medium_stickers + remaining_medium_stickers
+
+            if len(medium_stickers) < 2:
+                raise Exception("No stickers at the moment to create a package")
+
+            stickers_in_package = difficult_sticker + easy_stickers + medium_stickers
+
+            # Check for duplicates
+            id_list = []
+            for sticker in stickers_in_package:
+                if sticker.id not in id_list:
+                    id_list.append(sticker.id)
+            if len(id_list) < 5:
+                raise Exception("No stickers at the moment to create a package")
+
+        return PackageModel(stickers=stickers_in_package)
+
     async def find_by_query(
             self,
             ids: List[str],
             country: str = None,
             name: str = None
     ):
+        if name is not None:
+            matching = set(await self.search_by_name(name))
+            ids = [i for i in ids if i in matching]
         query = {"_id": {"$in": ids}}
         if country is not None:
             query["country"] = country
-        if name is not None:
-            query["$or"] = [
-                {"name": name.title()},
-                {"name": {"$regex": name.title(), "$options": "i"}}
-            ]
         stickers = await self.db["stickers"].find(query).to_list(100000)
         return stickers
 
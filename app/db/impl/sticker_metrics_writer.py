@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Union
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db.impl.sticker_catalog import StickerCatalog
+
+# Materialized sticker frequency report, one document per sticker with its metadata
+STICKERS_METRICS_REPORT = "stickers_metrics_report"
+METRICS_FLUSH_INTERVAL_SECONDS = 10
+# Flush as soon as there are this amount of different stickers waiting to be written
+METRICS_FLUSH_THRESHOLD = 200
+
+
+class StickerMetricsWriter:
+    """
+        Accumulates how many times each sticker came out of a package and writes the
+        deltas periodically as one unordered bulk of upserts, out of the request path.
+        The same deltas are applied to the materialized frequency report, and the
+        amount of packages is added to the opened counter of package-counter.
+    """
+
+    def __init__(
+            self,
+            db: AsyncIOMotorDatabase,
+            catalog: StickerCatalog,
+            flush_interval: float = METRICS_FLUSH_INTERVAL_SECONDS,
+            flush_threshold: int = METRICS_FLUSH_THRESHOLD,
+    ):
+        self.db = db
+        self.catalog = catalog
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.pending: Counter = Counter()
+        self.pending_packages = 0
+        # Report deltas whose metrics were written but the report update failed
+        self.pending_report: Counter = Counter()
+        self._task: Union[asyncio.Task, None] = None
+        self._wakeup: Union[asyncio.Event, None] = None
+
+    def record(self, sticker_ids: Iterable[str]):
+        """
+            Records the stickers of one opened package
+        """
+        self.pending.update(sticker_ids)
+        self.pending_packages += 1
+        if len(self.pending) >= self.flush_threshold and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        await self.count_packages()
+        if len(self.pending) == 0:
+            await self.update_report({})
+            return
+
+        batch = self.pending
+        self.pending = Counter()
+        sticker_ids = list(batch.keys())
+        operations = [
+            UpdateOne({"sticker_id": sid}, {"$inc": {"counter": batch[sid]}}, upsert=True)
+            for sid in sticker_ids
+        ]
+        written = sticker_ids
+        try:
+            await self.db["stickers_metrics"].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Only the failed upserts are retried on the next flush
+            failed = [sticker_ids[error["index"]] for error in e.details["writeErrors"]]
+            self.pending.update({sid: batch[sid] for sid in failed})
+            written = list(set(sticker_ids) - set(failed))
+            logging.error(f"[STICKER METRICS] {len(failed)} metrics could not be written: {e}")
+        except asyncio.CancelledError:
+            self.pending.update(batch)
+            raise
+        except Exception as e:
+            self.pending.update(batch)
+            logging.error(f"[STICKER METRICS] error writing metrics: {e}")
+            return
+
+        await self.update_report({sid: batch[sid] for sid in written})
+
+    async def count_packages(self):
+        if self.pending_packages == 0:
+            return
+
+        packages = self.pending_packages
+        self.pending_packages = 0
+        try:
+            # The document is created by the first package number reserved
+            await self.db["package-counter"].update_one({}, {"$inc": {"opened": packages}})
+        except asyncio.CancelledError:
+            self.pending_packages += packages
+            raise
+        except Exception as e:
+            self.pending_packages += packages
+            logging.error(f"[STICKER METRICS] error counting opened packages: {e}")
+
+    async def update_report(self, deltas: Dict[str, int]):
+        """
+            Applies the deltas and the ones that failed before to the report
+        """
+        deltas = self.pending_report + Counter(deltas)
+        self.pending_report = Counter()
+        sticker_ids = list(deltas.keys())
+        operations = []
+        for sid, delta in deltas.items():
+            update = {"$inc": {"counter": delta}}
+            sticker = self.catalog.stickers.get(sid)
+            if sticker is not None:
+                update["$set"] = {
+                    "name": sticker["name"],
+                    "number": sticker["number"],
+                    "country": sticker["country"],
+                }
+            operations.append(UpdateOne({"_id": sid}, update, upsert=True))
+
+        if len(operations) == 0:
+            return
+        try:
+            await self.db[STICKERS_METRICS_REPORT].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Metrics were already written, only the failed report updates are retried
+            failed = [sticker_ids[error["index"]] for error in e.details["writeErrors"]]
+            self.pending_report.update({sid: deltas[sid] for sid in failed})
+            logging.error(f"[STICKER METRICS] {len(failed)} report updates failed: {e}")
+        except asyncio.CancelledError:
+            self.pending_report.update(deltas)
+            raise
+        except Exception as e:
+            self.pending_report.update(deltas)
+            logging.error(f"[STICKER METRICS] error updating report: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self.run())
+
+    async def stop(self):
+        """
+            Stops the periodic flush and writes whatever is pending, so no counts are lost
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,87 @@
+from typing import Dict, List, Set
+
+from app.db.impl.text_normalization import fold
+
+TRIGRAM_SIZE = 3
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1)}
+
+
+class TrieNode:
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        # Stickers with a word starting with the prefix that leads to this node
+        self.ids: Set[str] = set()
+
+
+class StickerSearchIndex:
+    """
+        In-memory index over sticker names, ignoring case and accents.
+        Queries of 3 or more characters match anywhere in the name using a trigram index,
+        shorter ones match the beginning of any word of the name using a trie.
+    """
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.trigrams: Dict[str, Set[str]] = {}
+        self.trie = TrieNode()
+
+    def add(self, sticker_id: str, name: str):
+        if sticker_id in self.names:
+            self.remove(sticker_id)
+
+        folded = fold(name)
+        self.names[sticker_id] = folded
+        for trigram in trigrams(folded):
+            self.trigrams.setdefault(trigram, set()).add(sticker_id)
+        for word in folded.split(" "):
+            node = self.trie
+            for char in word:
+                node = node.children.setdefault(char, TrieNode())
+                node.ids.add(sticker_id)
+
+    def remove(self, sticker_id: str):
+        folded = self.names.pop(sticker_id, None)
+        if folded is None:
+            return
+
+        for trigram in trigrams(folded):
+            ids = self.trigrams[trigram]
+            ids.discard(sticker_id)
+            if len(ids) == 0:
+                del self.trigrams[trigram]
+        for word in folded.split(" "):
+            node = self.trie
+            for char in word:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                node.ids.discard(sticker_id)
+
+    def search(self, query: str) -> List[str]:
+        folded = fold(query)
+        if folded == "":
+            return list(self.names.keys())
+
+        if len(folded) < TRIGRAM_SIZE:
+            node = self.trie
+            for char in folded:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            return list(node.ids)
+
+        # Start from the rarest trigram so the candidates are as few as possible
+        postings = sorted(
+            (self.trigrams.get(t, set()) for t in trigrams(folded)), key=len
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if len(candidates) == 0:
+                return []
+
+        # Having all the trigrams doesn't mean they are contiguous
+        return [sid for sid in candidates if folded in self.names[sid]]
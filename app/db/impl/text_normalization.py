@@ -0,0 +1,11 @@
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """
+        Normalizes text for searching: case and accents are ignored and
+        whitespace is collapsed, so "  Thomas  Müller" becomes "thomas muller"
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(without_accents.casefold().split())
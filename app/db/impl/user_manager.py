@@ -1,17 +1,38 @@
 import datetime
 import logging
-from typing import Union
+import re
+from typing import AsyncIterator, Dict, List, Union
 from app.db import DatabaseManager, get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import Body, HTTPException
 
+from app.adapters.dtos.community_details import UserNameResponse
 from app.adapters.dtos.sticker_details import StickerDetailResponse
 from app.db.model.user import UserModel, UpdateUserModel
 from app.db.model.package import PackageModel
 from app.db.model.my_sticker import MyStickerModel
 from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument, UpdateOne
 
 TOTAL_STICKERS_ALBUM = None
+STATISTICS_REPAIR_BATCH_SIZE = 500
+# Written with $inc, so concurrent changes to them are not lost
+USER_COUNTER_FIELDS = ["package_counter", "exchanges_amount"]
+# Derived from the stickers, never written as they come in the model
+USER_STATISTICS_FIELDS = ["stickers_on_album", "stickers_collected", "album_completion_pct"]
+# Computed when the user is read, never written
+USER_DERIVED_FIELDS = ["id", "album_completion_pct", "has_daily_packages_available"]
+USERS_CURSOR_BATCH_SIZE = 200
+# Fields that can be asked for when listing users
+USER_FIELDS = [f for f in UserModel.__fields__.keys() if f != "id"]
+# Max users returned by a search by mail prefix
+MAIL_SEARCH_LIMIT = 50
+DAILY_PACKAGES = 2
+# Packages given once when the user completes the profile
+PROFILE_COMPLETE_PACKAGES = 3
+MAX_COMMUNITIES_PER_USER = 10
+# Amount of users registered each day, one document per date
+REGISTRATIONS_DAILY = "registrations_daily"
 
 
 async def getTotalStickersAlbum() -> int:
@@ -38,58 +59,435 @@ async def getTotalStickersAlbum() -> int:
     return TOTAL_STICKERS_ALBUM
 
 
+def count_stickers(stickers: List) -> Dict[str, int]:
+    """
+        Walks the stickers to get the stored statistics. Only used when the whole
+        stickers list is written and to repair the stored counters
+    """
+    stickers_on_album = 0
+    stickers_on_my_stickers_section = 0
+    for s in stickers:
+        if s["is_on_album"] is True:
+            stickers_on_album += 1
+        stickers_on_my_stickers_section += s["quantity"]
+    return {
+        "stickers_on_album": stickers_on_album,
+        "stickers_collected": stickers_on_my_stickers_section + stickers_on_album,
+    }
+
+
+def mail_key(mail: str) -> str:
+    """
+        Stored next to the mail as mail_key, so that mails are looked up ignoring case
+        with the index
+    """
+    return mail.lower()
+
+
+def daily_package_date() -> str:
+    """
+        Daily packages can be claimed once per day in Argentina's time (UTC-3)
+    """
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=3))\
+        .strftime('%Y-%m-%d')
+
+
+def to_model(user: Dict) -> UserModel:
+    if "stickers_on_album" not in user:
+        # User not migrated yet to the stored statistics
+        user = {**user, **count_stickers(user.get("stickers", []))}
+    model = UserModel(**user)
+    model.has_daily_packages_available = model.last_daily_claim != daily_package_date()
+    model._loaded = user
+    return model
+
+
+def merge_update(update: Dict, other: Dict) -> Dict:
+    for operator, fields in other.items():
+        update.setdefault(operator, {}).update(fields)
+    return update
+
+
+def as_pipeline_fields(update: Dict) -> Dict:
+    """
+        The $set and $inc of an update as the fields of a pipeline $set stage
+    """
+    fields = {field: {"$literal": value} for field, value in update.get("$set", {}).items()}
+    for field, amount in update.get("$inc", {}).items():
+        fields[field] = {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}
+    return fields
+
+
+def changed_and_added_stickers_pipeline(changed: Dict[str, Dict], added: List[Dict],
+                                        counters: Dict[str, int]) -> List[Dict]:
+    """
+        Update pipeline that applies the changes to the stickers by id and appends the
+        added ones, like open_package does. Added stickers that are already in the list,
+        because of a concurrent update, only increment their quantity
+    """
+    branches = [
+        {"case": {"$eq": ["$$s.id", sticker_id]}, "then": {"$mergeObjects": ["$$s", fields]}}
+        for sticker_id, fields in changed.items()
+    ]
+    branches += [
+        {
+            "case": {"$eq": ["$$s.id", sticker["id"]]},
+            "then": {"$mergeObjects": [
+                "$$s", {"quantity": {"$add": ["$$s.quantity", sticker["quantity"]]}}
+            ]},
+        }
+        for sticker in added
+    ]
+    stickers = {"$concatArrays": [
+        {"$map": {
+            "input": {"$ifNull": ["$stickers", []]},
+            "as": "s",
+            "in": {"$switch": {"branches": branches, "default": "$$s"}},
+        }},
+        {"$filter": {
+            "input": {"$literal": added},
+            "as": "n",
+            "cond": {"$not": [{"$in": ["$$n.id", {"$ifNull": ["$stickers.id", []]}]}]},
+        }},
+    ]}
+    return [{"$set": {"stickers": stickers, **as_pipeline_fields({"$inc": counters})}}]
+
+
+def diff_stickers(old: List[Dict], new: List[Dict]) -> Union[Dict, List[Dict]]:
+    """
+        Changes between two versions of the stickers list as update operators. Existing
+        stickers are updated by position and new ones are pushed, the counters are
+        changed by the same amount. If stickers were both changed and added the changes
+        are an update pipeline. If the list was reordered or shrunk the whole list is
+        written
+    """
+    if len(new) < len(old) or any(o["id"] != n["id"] for o, n in zip(old, new)):
+        return {"$set": {"stickers": new, **count_stickers(new)}}
+
+    inc = {}
+    set_fields = {}
+    # The same changes by sticker id, for the pipeline
+    changed = {}
+    quantity_delta = 0
+    on_album_delta = 0
+    for i, (o, n) in enumerate(zip(old, new)):
+        if n["quantity"] != o["quantity"]:
+            inc[f"stickers.{i}.quantity"] = n["quantity"] - o["quantity"]
+            changed.setdefault(n["id"], {})["quantity"] = \
+                {"$add": ["$$s.quantity", n["quantity"] - o["quantity"]]}
+            quantity_delta += n["quantity"] - o["quantity"]
+        if n["is_on_album"] != o["is_on_album"]:
+            set_fields[f"stickers.{i}.is_on_album"] = n["is_on_album"]
+            changed.setdefault(n["id"], {})["is_on_album"] = n["is_on_album"]
+            on_album_delta += 1 if n["is_on_album"] else -1
+
+    update = {}
+    added = new[len(old):]
+    if len(added) > 0 and len(changed) > 0:
+        added_counters = count_stickers(added)
+        on_album_delta += added_counters["stickers_on_album"]
+        quantity_delta += added_counters["stickers_collected"] \
+            - added_counters["stickers_on_album"]
+        counters = {
+            "stickers_on_album": on_album_delta,
+            "stickers_collected": quantity_delta + on_album_delta,
+        }
+        return changed_and_added_stickers_pipeline(
+            changed, added, {k: v for k, v in counters.items() if v != 0}
+        )
+    if len(added) > 0:
+        update["$push"] = {"stickers": {"$each": added}}
+        added_counters = count_stickers(added)
+        quantity_delta = added_counters["stickers_collected"] - added_counters["stickers_on_album"]
+        on_album_delta = added_counters["stickers_on_album"]
+
+    if on_album_delta != 0:
+        inc["stickers_on_album"] = on_album_delta
+    if quantity_delta + on_album_delta != 0:
+        inc["stickers_collected"] = quantity_delta + on_album_delta
+    if len(inc) > 0:
+        update["$inc"] = inc
+    if len(set_fields) > 0:
+        update["$set"] = set_fields
+    return update
+
+
+def build_user_update(user: Union[UserModel, UpdateUserModel]) -> Union[Dict, List[Dict]]:
+    """
+        Update operators for the fields that changed since the user was read. Models
+        that were not read from the database, like the request bodies, have all their
+        fields set
+    """
+    payload = {k: v for k, v in user.dict().items()
+               if v is not None and k not in USER_DERIVED_FIELDS}
+    loaded = user._loaded if isinstance(user, UserModel) else None
+    if loaded is None:
+        if "stickers" in payload:
+            # The whole list is written, so the statistics are written with it
+            payload.update(count_stickers(payload["stickers"]))
+        if "mail" in payload:
+            payload["mail_key"] = mail_key(payload["mail"])
+        return {"$set": payload} if len(payload) > 0 else {}
+
+    update = {}
+    pipeline = None
+    for field, value in payload.items():
+        if field in USER_STATISTICS_FIELDS:
+            continue
+        old = loaded.get(field, UserModel.__fields__[field].default)
+        if field == "stickers":
+            stickers_update = diff_stickers(old, value)
+            if isinstance(stickers_update, list):
+                pipeline = stickers_update
+            else:
+                merge_update(update, stickers_update)
+        elif value == old:
+            continue
+        elif field in USER_COUNTER_FIELDS:
+            merge_update(update, {"$inc": {field: value - old}})
+        else:
+            merge_update(update, {"$set": {field: value}})
+    if "mail" in update.get("$set", {}):
+        update["$set"]["mail_key"] = mail_key(update["$set"]["mail"])
+    if pipeline is not None:
+        # The other fields go in the same stage, pipelines can't be mixed with operators
+        pipeline[0]["$set"].update(as_pipeline_fields(update))
+        return pipeline
+    return update
+
+
 async def set_statistics(model: UserModel):
-    stickers_on_album = list(filter(lambda x: x.is_on_album is True, model.stickers))
-    stickers_on_album_amount = len(stickers_on_album)
     totalStickers = await getTotalStickersAlbum()
-    model.album_completion_pct = round(stickers_on_album_amount / totalStickers * 100, 2)
-    stickers_on_my_stickers_section = [i.quantity for i in model.stickers]
-    model.stickers_collected = sum(stickers_on_my_stickers_section) + stickers_on_album_amount
+    model.album_completion_pct = round(model.stickers_on_album / totalStickers * 100, 2)
     return model
 
 
+def user_projection(fields: List[str]) -> Dict:
+    projection = {f: 1 for f in fields if f not in USER_DERIVED_FIELDS}
+    if "album_completion_pct" in fields:
+        projection["stickers_on_album"] = 1
+    if "has_daily_packages_available" in fields:
+        projection["last_daily_claim"] = 1
+    return projection
+
+
+async def project_user(user: Dict, fields: List[str]) -> Dict:
+    """
+        Only the asked fields of the user, without building the whole model. Missing
+        fields get their default value
+    """
+    row = {"_id": user["_id"]}
+    for field in fields:
+        if field == "album_completion_pct":
+            totalStickers = await getTotalStickersAlbum()
+            row[field] = round(user.get("stickers_on_album", 0) / totalStickers * 100, 2)
+        elif field == "has_daily_packages_available":
+            row[field] = user.get("last_daily_claim") != daily_package_date()
+        else:
+            row[field] = user.get(field, UserModel.__fields__[field].default)
+    return jsonable_encoder(row)
+
+
 class UserManager:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
 
+    async def ensure_indexes(self):
+        await self.db["users"].create_index("mail_key")
+        # Users created before the mail_key
+        await self.db["users"].update_many(
+            {"mail_key": {"$exists": False}},
+            [{"$set": {"mail_key": {"$toLower": "$mail"}}}],
+        )
+        # Users that claimed their daily packages before last_daily_claim was stored
+        await self.db["users"].update_many(
+            {"last_daily_claim": {"$exists": False}, "has_daily_packages_available": False},
+            {"$set": {"last_daily_claim": daily_package_date()}},
+        )
+        # Backfill the registrations the first time
+        if await self.db[REGISTRATIONS_DAILY].estimated_document_count() == 0:
+            await self.rebuild_registrations_daily()
+
     async def get_all(self):
-        users = await self.db["users"].find().to_list(2000)
         models = []
-        for user in users:
-            model = UserModel(**user)
+        async for user in self.db["users"].find().batch_size(USERS_CURSOR_BATCH_SIZE):
+            model = to_model(user)
             model = await set_statistics(model)
             models.append(model)
         return models
 
+    async def iter_users(
+            self,
+            after: str = None,
+            limit: int = None,
+            fields: List[str] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+            Users ordered by id, encoded one at a time as they come from the cursor.
+            The next page starts after the id of the last user returned
+        """
+        query = {} if after is None else {"_id": {"$gt": after}}
+        projection = None if fields is None else user_projection(fields)
+        cursor = self.db["users"].find(query, projection) \
+            .sort("_id", 1) \
+            .batch_size(USERS_CURSOR_BATCH_SIZE)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        async for user in cursor:
+            if fields is None:
+                model = to_model(user)
+                model = await set_statistics(model)
+                yield jsonable_encoder(model)
+            else:
+                yield await project_user(user, fields)
+
     async def get_by_id(self, id: str):
         user = await self.db["users"].find_one({"_id": id})
         if user is not None:
-            model = UserModel(**user)
+            model = to_model(user)
             model = await set_statistics(model)
             return model
         return None
 
+    async def get_user_summaries(self, ids: List[str]) -> Dict[str, UserNameResponse]:
+        """
+            Name, lastname and mail of the given users, by id and in the order of ids.
+            Users that do not exist are left out
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        if len(unique_ids) == 0:
+            return {}
+        users = await self.db["users"] \
+            .find({"_id": {"$in": unique_ids}}, {"name": 1, "lastname": 1, "mail": 1}) \
+            .to_list(len(unique_ids))
+        by_id = {user["_id"]: user for user in users}
+        return {
+            id: UserNameResponse(
+                id=id,
+                name=by_id[id]["name"],
+                lastname=by_id[id]["lastname"],
+                mail=by_id[id]["mail"],
+            )
+            for id in unique_ids if id in by_id
+        }
+
     async def get_user_by_mail(self, mail: str):
-        user = await self.db["users"].find_one({"mail": mail})
-        model = UserModel(**user)
+        user = await self.db["users"].find_one({"mail_key": mail_key(mail)})
+        model = to_model(user)
         model = await set_statistics(model)
         return model
 
-    async def get_users_by_mail(self, mail: str):
+    async def complete_profile(self, id: str) -> Union[UserModel, None]:
+        """
+            Marks the profile as complete and gives its packages, in one update that only
+            applies if it was not complete yet, so they are given once. Returns the user
+            as it is after the update, or None if the user does not exist
+        """
+        user = await self.db["users"].find_one_and_update(
+            {"_id": id, "is_profile_complete": {"$ne": True}},
+            {
+                "$set": {"is_profile_complete": True},
+                "$inc": {"package_counter": PROFILE_COMPLETE_PACKAGES},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if user is None:
+            # Completed by a concurrent request
+            return await self.get_by_id(id)
+        model = to_model(user)
+        model = await set_statistics(model)
+        return model
+
+    async def claim_daily_packages(self, id: str) -> Union[UserModel, None]:
+        """
+            Adds the daily packages to the user if they were not claimed today, in one
+            atomic update that returns the updated user. Returns None if the user has
+            no daily packages available
+        """
+        today = daily_package_date()
+        user = await self.db["users"].find_one_and_update(
+            {"_id": id, "last_daily_claim": {"$ne": today}},
+            {
+                "$set": {"last_daily_claim": today},
+                "$inc": {"package_counter": DAILY_PACKAGES},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if user is None:
+            return None
+        model = to_model(user)
+        model = await set_statistics(model)
+        return model
+
+    async def reserve_community_slot(self, id: str) -> bool:
+        """
+            Counts one more community for the user, only if the profile is complete and
+            the user is in less than MAX_COMMUNITIES_PER_USER communities
+        """
+        result = await self.db["users"].update_one(
+            {
+                "_id": id,
+                "is_profile_complete": True,
+                "communities_count": {"$not": {"$gte": MAX_COMMUNITIES_PER_USER}},
+            },
+            {"$inc": {"communities_count": 1}},
+        )
+        return result.modified_count == 1
+
+    async def release_community_slot(self, id: str):
+        await self.db["users"].update_one(
+            {"_id": id, "communities_count": {"$gt": 0}},
+            {"$inc": {"communities_count": -1}},
+        )
+
+    async def iter_fcm_tokens(self) -> AsyncIterator[str]:
+        users = self.db["users"] \
+            .find({"fcmToken": {"$nin": ["", None]}}, {"fcmToken": 1}) \
+            .batch_size(USERS_CURSOR_BATCH_SIZE)
+        async for user in users:
+            yield user["fcmToken"]
+
+    async def get_users_by_mail(self, mail: str, limit: int = MAIL_SEARCH_LIMIT):
+        """
+            Users whose mail starts with the given one, ignoring case
+        """
+        query = {"mail_key": {"$regex": f"^{re.escape(mail_key(mail))}"}}
         users = await self.db["users"] \
-            .find({"mail": {"$regex": mail, "$options": "i"}}).to_list(5000)
+            .find(query, {"_id": 1, "mail": 1}) \
+            .limit(limit) \
+            .to_list(limit)
         return users
 
     async def add_new(self, user: UserModel = Body(...)):
         new = jsonable_encoder(user)
-        await self.db["users"].insert_one(new)
+        await self.db["users"].insert_one({
+            **new,
+            "mail_key": mail_key(new["mail"]),
+            "communities_count": 0,
+        })
+        register_date = new.get("register_date") or datetime.date.today().strftime('%Y-%m-%d')
+        await self.db[REGISTRATIONS_DAILY].update_one(
+            {"_id": register_date}, {"$inc": {"count": 1}}, upsert=True
+        )
         return new
 
-    async def update(self, id: str, user: UpdateUserModel = Body(...)):
+    async def update(self, id: str, user: Union[UserModel, UpdateUserModel] = Body(...)):
+        """
+            Writes only what changed and returns the user as it was left by the update
+        """
         try:
-            user = {k: v for k, v in user.dict().items() if v is not None}
-            await self.db["users"].update_one({"_id": id}, {"$set": user})
-            model = await self.get_by_id(id)
+            update = build_user_update(user)
+            if len(update) == 0:
+                return await self.get_by_id(str(id))
+            user = await self.db["users"].find_one_and_update(
+                {"_id": str(id)},
+                update,
+                return_document=ReturnDocument.AFTER,
+            )
+            if user is None:
+                return None
+            model = to_model(user)
+            model = await set_statistics(model)
             return model
         except Exception as e:
             msg = f"[UPDATE_USER] id: {id} error: {e}"
@@ -128,43 +526,111 @@ class UserManager:
             raise RuntimeError(msg)
 
     async def paste_sticker(self, user_id: str, sticker_id: str):
-        model = await self.get_by_id(user_id)
-        for s in model.stickers:
-            if s.id == sticker_id:
-                if s.is_on_album:
-                    raise HTTPException(status_code=400, detail=f"Sticker {s.id} is already pasted")
-                if s.quantity <= 0:
-                    msg = f"Sticker quantity for {s.id} is {s.quantity}"
-                    raise HTTPException(status_code=400, detail=msg)
-                s.is_on_album = True
-                s.quantity -= 1
-        await self.db["users"].update_one(
-            {"_id": user_id},
-            {"$set": model.dict()},
-            upsert=False
+        """
+            Pastes the sticker with a conditional update of just that sticker, so it can't
+            overwrite or be overwritten by other writes of the user, like opening a package
+        """
+        user = await self.db["users"].find_one_and_update(
+            {"_id": user_id, "stickers": {"$elemMatch": {
+                "id": sticker_id,
+                "is_on_album": False,
+                "quantity": {"$gt": 0},
+            }}},
+            {
+                "$set": {"stickers.$.is_on_album": True},
+                "$inc": {"stickers.$.quantity": -1, "stickers_on_album": 1},
+            },
+            return_document=ReturnDocument.AFTER,
         )
+        if user is not None:
+            model = to_model(user)
+            model = await set_statistics(model)
+            return model
+
+        # Only when it could not be pasted, find out why
+        user = await self.db["users"].find_one(
+            {"_id": user_id, "stickers.id": sticker_id}, {"stickers.$": 1}
+        )
+        if user is None:
+            raise HTTPException(
+                status_code=400, detail=f"User {user_id} doesn't have sticker {sticker_id}"
+            )
+        s = MyStickerModel(**user["stickers"][0])
+        if s.is_on_album:
+            raise HTTPException(status_code=400, detail=f"Sticker {s.id} is already pasted")
+        msg = f"Sticker quantity for {s.id} is {s.quantity}"
+        raise HTTPException(status_code=400, detail=msg)
 
-        user = await self.get_by_id(user_id)
-        return user
+    async def has_packages(self, user_id: str) -> bool:
+        """
+            True if the user exists and has packages to open, reading only its _id
+        """
+        user = await self.db["users"].find_one(
+            {"_id": user_id, "package_counter": {"$gt": 0}}, {"_id": 1}
+        )
+        return user is not None
 
     async def open_package(
             self, user_id: str, package: PackageModel
     ):
+        """
+            Takes a package from the user and adds its stickers in one update:
+            stickers already in the user list increment their quantity and the others
+            are appended. The stickers details are built from the updated user.
+        """
         try:
-            stickers_response = []
-            for sticker in package.stickers:
-                sticker_id = str(sticker.id)
-                on_my_list = await self.update_sticker(user_id, sticker_id)
-                if not on_my_list:
-                    await self.add_new_sticker(user_id, sticker_id)
-                model = await self.get_by_id(user_id)
-                iterator_stickers = iter(model.stickers)
-                sticker_user = next(
-                    s for s in iterator_stickers if str(s.id) == str(sticker.id)
+            sticker_ids = [str(sticker.id) for sticker in package.stickers]
+            new_stickers = [
+                MyStickerModel(id=sticker_id, quantity=1, is_on_album=False).dict()
+                for sticker_id in sticker_ids
+            ]
+            my_stickers = {"$ifNull": ["$stickers", []]}
+            update = [{"$set": {
+                "stickers": {"$concatArrays": [
+                    {"$map": {
+                        "input": my_stickers,
+                        "as": "s",
+                        "in": {"$cond": [
+                            {"$in": ["$$s.id", sticker_ids]},
+                            {"$mergeObjects": [
+                                "$$s", {"quantity": {"$add": ["$$s.quantity", 1]}}
+                            ]},
+                            "$$s"
+                        ]}
+                    }},
+                    {"$filter": {
+                        "input": {"$literal": new_stickers},
+                        "as": "n",
+                        "cond": {"$not": [{"$in": ["$$n.id", {"$ifNull": ["$stickers.id", []]}]}]}
+                    }}
+                ]},
+                "stickers_collected": {
+                    "$add": [{"$ifNull": ["$stickers_collected", 0]}, len(sticker_ids)]
+                },
+                "package_counter": {"$subtract": ["$package_counter", 1]},
+            }}]
+
+            user = await self.db["users"].find_one_and_update(
+                {"_id": user_id, "package_counter": {"$gt": 0}},
+                update,
+                projection={"stickers": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if user is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"User {user_id} doesn't have any packages to open",
                 )
-                sticker_detail = self.create_detail_stickers(sticker, sticker_user)
-                stickers_response.append(sticker_detail)
-            return stickers_response
+
+            my_stickers_by_id = {
+                s["id"]: MyStickerModel(**s) for s in user["stickers"] if s["id"] in sticker_ids
+            }
+            return [
+                self.create_detail_stickers(sticker, my_stickers_by_id[str(sticker.id)])
+                for sticker in package.stickers
+            ]
+        except HTTPException as e:
+            raise e
         except Exception as e:
             msg = f"[OPEN PACKAGE] id: {user_id} error: {e}"
             logging.error(msg)
@@ -182,48 +648,39 @@ class UserManager:
         )
         return sticker_detail
 
-    async def update_sticker(self, user_id: str, sticker_id: str):
+    async def repair_statistics(self, only_missing: bool = False,
+                                batch_size: int = STATISTICS_REPAIR_BATCH_SIZE) -> Dict[str, int]:
         """
-            If sticker already in user list then increment quantity
+            Recomputes the stored statistics from the stickers of each user and fixes the
+            ones that differ. With only_missing it just migrates users without them.
         """
-        try:
-            user = await self.db["users"].find_one(
-                {"_id": user_id, "stickers.id": sticker_id}
-            )
-            if user is not None:
-                await self.db["users"].update_one(
-                    {"_id": user_id, "stickers.id": sticker_id},
-                    {"$inc": {"stickers.$.quantity": 1}},
-                    upsert=False
-                )
-                return True
-            return False
-        except Exception as e:
-            msg = f"[UPDATE STICKER] id: {user_id} error: {e}"
-            logging.error(msg)
-            raise RuntimeError(msg)
+        query = {"stickers_on_album": {"$exists": False}} if only_missing else {}
+        projection = {"stickers": 1, "stickers_on_album": 1, "stickers_collected": 1}
+        checked = 0
+        repaired = 0
+        operations = []
+        async for user in self.db["users"].find(query, projection).batch_size(batch_size):
+            checked += 1
+            statistics = count_stickers(user.get("stickers", []))
+            if any(user.get(k) != v for k, v in statistics.items()):
+                operations.append(UpdateOne({"_id": user["_id"]}, {"$set": statistics}))
+            if len(operations) >= batch_size:
+                await self.db["users"].bulk_write(operations, ordered=False)
+                repaired += len(operations)
+                operations = []
+
+        if len(operations) > 0:
+            await self.db["users"].bulk_write(operations, ordered=False)
+            repaired += len(operations)
 
-    async def add_new_sticker(self, user_id: str, sticker_id: str):
+        logging.info(f"[REPAIR STATISTICS] checked: {checked} repaired: {repaired}")
+        return {"checked": checked, "repaired": repaired}
+
+    async def rebuild_registrations_daily(self):
         """
-            If sticker is not in user list then create MySticker
+            Counts the users registered each day from the users collection, replacing
+            the registrations series
         """
-        try:
-            my_sticker = MyStickerModel(
-                id=sticker_id,
-                quantity=1,
-                is_on_album=False
-            )
-            new = {k: v for k, v in my_sticker.dict().items() if v is not None}
-            await self.db["users"].update_one(
-                {"_id": user_id},
-                {"$push": {"stickers": new}}
-            )
-        except Exception as e:
-            msg = f"[ADD NEW STICKER] id: {user_id} error: {e}"
-            logging.error(msg)
-            raise RuntimeError(msg)
-
-    async def get_register_info(self):
         pipeline = [
             {
                 '$group': {
@@ -239,38 +696,37 @@ class UserManager:
                 }
             },
             {
-                '$sort': {
-                    '_id': 1
-                }
-            },
-            {
-                '$group': {
-                    '_id': 'result',
-                    'result': {
-                        '$push': {
-                            'k': '$_id',
-                            'v': '$count'
-                        }
-                    }
-                }
-            },
-            {
-                '$replaceRoot': {
-                    'newRoot': {
-                        '$arrayToObject': '$result'
-                    }
-                }
+                '$out': REGISTRATIONS_DAILY
             }
         ]
-        async for user in self.db["users"].aggregate(pipeline):
-            data_tuple = sorted(user.items())
-            data = dict(data_tuple)
-
-            last = data_tuple[0][1]
-            for k, v in data_tuple[1:]:
-                data[k] += last
-                last = data[k]
-            return data
+        await self.db["users"].aggregate(pipeline).to_list(None)
+
+    async def get_register_info(self, start: str = None, end: str = None) -> Dict[str, int]:
+        """
+            Total of registered users at the end of each day with registrations, between
+            start and end (YYYY-MM-DD) when given
+        """
+        total = 0
+        query = {}
+        if start is not None:
+            query["$gte"] = start
+            previous = await self.db[REGISTRATIONS_DAILY].aggregate([
+                {'$match': {'_id': {'$lt': start}}},
+                {'$group': {'_id': None, 'count': {'$sum': '$count'}}},
+            ]).to_list(1)
+            if len(previous) > 0:
+                total = previous[0]['count']
+        if end is not None:
+            query["$lte"] = end
+
+        data = {}
+        days = self.db[REGISTRATIONS_DAILY] \
+            .find({'_id': query} if len(query) > 0 else {}) \
+            .sort('_id', 1)
+        async for day in days:
+            total += day['count']
+            data[day['_id']] = total
+        return data
 
 
 instance: Union[UserManager, None] = None
@@ -4,6 +4,8 @@ from pydantic import Field
 
 class PackageCounterModel(BaseModel):
     counter: int = Field(...)
+    # Packages opened, counter also has the numbers reserved by workers but not used
+    opened: int = 0
 
     def __getitem__(self, item):
         return getattr(self, item)
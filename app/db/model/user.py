@@ -1,9 +1,10 @@
 from app.db.model.py_object_id import PyObjectId
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from pydantic.main import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from bson import ObjectId
+from collections import Counter
 from app.db.model.my_sticker import MyStickerModel
 from datetime import datetime, timezone, timedelta
 
@@ -19,14 +20,58 @@ class UserModel(BaseModel):
     favorite_countries: List[str] = []
     is_profile_complete: bool = False
     package_counter: int = 0
+    # Stored with the stickers: counted by user_manager.count_stickers and diff_stickers
+    # on updates, and incremented by open_package and paste_sticker.
+    # album_completion_pct is derived on read by user_manager.set_statistics
+    stickers_on_album: int = 0
     stickers_collected: int = 0
     album_completion_pct: float = 0
     exchanges_amount: int = 0
+    # Derived on read from last_daily_claim, see user_manager.to_model
     has_daily_packages_available: bool = True
+    last_daily_claim: Optional[str] = None
     fcmToken: str = ""
     register_date: str = (datetime.now(timezone.utc) - timedelta(hours=3))\
         .strftime('%Y-%m-%d')
     is_admin: bool = False
+    # Document as it was read, so that updates only send what changed
+    _loaded: Optional[Dict] = PrivateAttr(default=None)
+    # Stickers by id, built on first use, and the stickers list it was built from
+    _inventory: Optional[Dict[str, MyStickerModel]] = PrivateAttr(default=None)
+    _inventory_of: Optional[List[MyStickerModel]] = PrivateAttr(default=None)
+
+    def inventory(self) -> Dict[str, MyStickerModel]:
+        # Rebuilt if stickers were assigned, added or removed without add_sticker
+        if self._inventory is None or self._inventory_of is not self.stickers \
+                or len(self._inventory) != len(self.stickers):
+            self._inventory = {s.id: s for s in self.stickers}
+            self._inventory_of = self.stickers
+        return self._inventory
+
+    def get_sticker(self, sticker_id: str) -> Optional[MyStickerModel]:
+        return self.inventory().get(sticker_id)
+
+    def has_stickers(self, sticker_ids: List[str]) -> bool:
+        """
+            True if the user has at least as many copies of each sticker as times it
+            is in sticker_ids
+        """
+        inventory = self.inventory()
+        for sticker_id, amount in Counter(sticker_ids).items():
+            sticker = inventory.get(sticker_id)
+            if sticker is None or sticker.quantity < amount:
+                return False
+        return True
+
+    def add_sticker(self, sticker_id: str, quantity: int = 1) -> MyStickerModel:
+        sticker = self.get_sticker(sticker_id)
+        if sticker is not None:
+            sticker.quantity += quantity
+            return sticker
+        sticker = MyStickerModel(id=sticker_id, quantity=quantity, is_on_album=False)
+        self._inventory[sticker_id] = sticker
+        self.stickers.append(sticker)
+        return sticker
 
     def isProfileComplete(self) -> bool:
         if self.mail == "" or self.name == ""\
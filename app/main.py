@@ -12,6 +12,11 @@ from app.conf.config import Settings
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.db import db
+from app.db.impl.sticker_catalog import catalog as sticker_catalog
+from app.db.impl.community_manager import GetCommunityManager
+from app.db.impl.exchange_manager import GetExchangeManager
+from app.db.impl.sticker_manager import GetStickerManager
+from app.db.impl.user_manager import GetUserManager
 from fastapi_pagination import add_pagination
 
 # logging.config.fileConfig('app/conf/logging.conf', disable_existing_loggers=False)
@@ -51,10 +56,50 @@ async def ping():
 @app.on_event("startup")
 async def startup():
     await db.connect_to_database(path=settings.db_path)
+    try:
+        await sticker_catalog.ensure_loaded(db.db)
+    except Exception as e:
+        # It will be loaded by the first package opened
+        logger.warning(f"Could not warm up sticker catalog. Exception: {e}")
+    sticker_manager = await GetStickerManager()
+    try:
+        await sticker_manager.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create stickers indexes. Exception: {e}")
+    sticker_manager.package_pool.start()
+    sticker_manager.metrics_writer.start()
+
+    user_manager = await GetUserManager()
+    try:
+        await user_manager.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create users indexes. Exception: {e}")
+    community_manager = await GetCommunityManager()
+    try:
+        await community_manager.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create communities indexes. Exception: {e}")
+    try:
+        await community_manager.ensure_communities_count()
+    except Exception as e:
+        logger.error(f"Could not migrate users communities count. Exception: {e}")
+    exchange_manager = await GetExchangeManager()
+    try:
+        await exchange_manager.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create exchanges indexes. Exception: {e}")
+    try:
+        await user_manager.repair_statistics(only_missing=True)
+    except Exception as e:
+        logger.error(f"Could not migrate users statistics. Exception: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    sticker_manager = await GetStickerManager()
+    await sticker_manager.package_pool.stop()
+    # Write the sticker metrics that are still in memory before closing the connection
+    await sticker_manager.metrics_writer.stop()
     await db.close_database_connection()
 
 add_pagination(app)
@@ -0,0 +1,56 @@
+"""
+    Compares the previous get_random_stickers_from_list implementation with the
+    sampling engine used to build packages.
+
+    Run with: python -m benchmarks.sampling_benchmark
+"""
+import random
+import timeit
+from typing import List, Union
+
+from app.db.impl.sampling import sample_without_replacement
+
+CATALOG_SIZES = [600, 10_000, 100_000]
+STICKERS_PER_DRAW = 5
+
+
+def legacy_random_stickers_from_list(sticker_list: List, amount_of_stickers_desired: int,
+                                     rng: Union[random.Random, None] = None):
+    """
+        Previous implementation, kept as a reference for the benchmark and the
+        distribution tests.
+    """
+    rng = rng or random
+    random_sticker_list = []
+    amount_of_stickers_to_return = min(amount_of_stickers_desired, len(sticker_list))
+    positions_stickers_added = []
+
+    for i in range(amount_of_stickers_to_return):
+        random_pos = rng.choice(
+            [number for number in range(0, len(sticker_list))
+             if number not in positions_stickers_added]
+        )
+        random_sticker_list.append(sticker_list[random_pos])
+        positions_stickers_added.append(random_pos)
+
+    return random_sticker_list
+
+
+def time_per_draw(sampler, catalog_size: int, repeat: int) -> float:
+    stickers = list(range(catalog_size))
+    rng = random.Random(0)
+    total = timeit.timeit(lambda: sampler(stickers, STICKERS_PER_DRAW, rng), number=repeat)
+    return total / repeat
+
+
+def main():
+    print(f"{'catalog size':>12} | {'legacy (ms)':>12} | {'new (ms)':>10} | {'speedup':>8}")
+    for size in CATALOG_SIZES:
+        repeat = max(1, 200_000 // size)
+        legacy = time_per_draw(legacy_random_stickers_from_list, size, repeat)
+        new = time_per_draw(sample_without_replacement, size, repeat * 100)
+        print(f"{size:>12} | {legacy * 1000:>12.4f} | {new * 1000:>10.4f} | {legacy / new:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
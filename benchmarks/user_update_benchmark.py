@@ -0,0 +1,141 @@
+"""
+    Compares the previous UserManager.update, a $set of every field followed by a
+    read of the user, with the update that only sends what changed.
+
+    Run with: python -m benchmarks.user_update_benchmark
+"""
+import asyncio
+from typing import Dict, List
+from unittest.mock import patch
+
+import bson
+from pymongo import ReturnDocument
+
+from app.db.impl.user_manager import UserManager, count_stickers, to_model
+from app.db.model.my_sticker import MyStickerModel
+
+ALBUM_SIZES = [50, 300, 640]
+
+
+class CountingUsersCollection:
+    """
+        Keeps a single user in memory and counts the round trips and the bytes sent
+    """
+
+    def __init__(self, user: Dict):
+        self.user = user
+        self.round_trips = 0
+        self.bytes_sent = 0
+
+    def sent(self, *documents):
+        self.round_trips += 1
+        # Update pipelines are lists, they are sent inside the command document
+        self.bytes_sent += sum(
+            len(bson.encode(d if isinstance(d, dict) else {"u": d})) for d in documents
+        )
+
+    async def update_one(self, query, update):
+        self.sent(query, update)
+
+    async def find_one(self, query):
+        self.sent(query)
+        return self.user
+
+    async def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE):
+        self.sent(query, update)
+        return self.user
+
+
+class CountingDatabase:
+    def __init__(self, collection: CountingUsersCollection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+async def legacy_update(db, id: str, user):
+    """
+        Previous implementation, kept as a reference for the benchmark.
+    """
+    user = {k: v for k, v in user.dict().items() if v is not None}
+    if "stickers" in user:
+        user.update(count_stickers(user["stickers"]))
+    await db["users"].update_one({"_id": id}, {"$set": user})
+    return await UserManager(db).get_by_id(id)
+
+
+def make_user(album_size: int) -> Dict:
+    stickers: List[Dict] = [
+        {"id": f"{i:024x}", "is_on_album": i % 2 == 0, "quantity": i % 3}
+        for i in range(album_size)
+    ]
+    return {
+        "_id": "6373d6d5a1a1b8bd2f1e2f40",
+        "mail": "user@mail.com",
+        "name": "name",
+        "lastname": "lastname",
+        "date_of_birth": "1990-01-01",
+        "stickers": stickers,
+        "package_counter": 4,
+        **count_stickers(stickers),
+    }
+
+
+def claim_daily_package(user):
+    user.has_daily_packages_available = False
+    user.package_counter += 2
+
+
+def give_stickers(user):
+    for sticker in user.stickers[:3]:
+        sticker.quantity += 1
+    user.exchanges_amount += 1
+
+
+def receive_new_sticker(user):
+    user.stickers.append(MyStickerModel(id="f" * 24, quantity=1, is_on_album=False))
+
+
+def accept_exchange(user):
+    """
+        What applyAccept does to the receiver: gives some stickers and gets new ones
+    """
+    for sticker in user.stickers[1:3]:
+        sticker.quantity -= 1
+    for i in range(2):
+        user.stickers.append(MyStickerModel(id=f"{i:x}" * 24, quantity=1, is_on_album=False))
+    user.exchanges_amount += 1
+
+
+MUTATIONS = {
+    "daily package": claim_daily_package,
+    "give stickers": give_stickers,
+    "new sticker": receive_new_sticker,
+    "exchange": accept_exchange,
+}
+
+
+def measure(update, album_size: int, mutation) -> CountingUsersCollection:
+    document = make_user(album_size)
+    collection = CountingUsersCollection(document)
+    user = to_model(document)
+    mutation(user)
+    asyncio.run(update(CountingDatabase(collection), document["_id"], user))
+    return collection
+
+
+def main():
+    print(f"{'mutation':>14} | {'stickers':>8} | {'legacy trips':>12} | {'legacy bytes':>12}"
+          f" | {'new trips':>9} | {'new bytes':>9}")
+    with patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", max(ALBUM_SIZES)):
+        for name, mutation in MUTATIONS.items():
+            for size in ALBUM_SIZES:
+                legacy = measure(legacy_update, size, mutation)
+                new = measure(lambda db, id, user: UserManager(db).update(id, user), size, mutation)
+                print(f"{name:>14} | {size:>8} | {legacy.round_trips:>12} | "
+                      f"{legacy.bytes_sent:>12} | {new.round_trips:>9} | {new.bytes_sent:>9}")
+
+
+if __name__ == "__main__":
+    main()
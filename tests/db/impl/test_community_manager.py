@@ -0,0 +1,162 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from pymongo.errors import DuplicateKeyError
+
+from app.db.impl.community_manager import CommunityManager
+from app.db.model.community import CommunityModel, UpdateCommunityModel
+from tests.factories import FakeCursor
+
+
+def make_member(user_id: str) -> dict:
+    return {"_id": user_id, "name": f"name {user_id}", "lastname": "lastname", "mail": "m"}
+
+
+class TestCommunityWithMembers(unittest.TestCase):
+    def test_members_are_read_with_the_community_in_order(self):
+        db = MagicMock()
+        db["communities"].aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "_id": "6373d6d5a1a1b8bd2f1e2f40",
+            "name": "community",
+            "owner": "u1",
+            "users": ["u1", "u2", "u3"],
+            "members": [make_member("u3"), make_member("u1")],
+        }])
+
+        comm, members = asyncio.run(
+            CommunityManager(db).get_with_members("6373d6d5a1a1b8bd2f1e2f40")
+        )
+
+        assert comm.users == ["u1", "u2", "u3"]
+        assert [m.id for m in members] == ["u1", "u3"]
+        assert db["communities"].aggregate.call_count == 1
+        lookup = db["communities"].aggregate.call_args[0][0][1]["$lookup"]
+        assert lookup["from"] == "users"
+
+    def test_community_not_found(self):
+        db = MagicMock()
+        db["communities"].aggregate.return_value.to_list = AsyncMock(return_value=[])
+
+        assert asyncio.run(CommunityManager(db).get_with_members("c1")) is None
+
+
+class TestCommunityNames(unittest.TestCase):
+    def test_new_community_is_stored_with_its_name_key(self):
+        db = MagicMock()
+        db["communities"].insert_one = AsyncMock()
+
+        new = asyncio.run(CommunityManager(db).add_new(
+            CommunityModel(name="  Los  Pibes de Córdoba", owner="u1")
+        ))
+
+        stored = db["communities"].insert_one.call_args[0][0]
+        assert stored["name_key"] == "los pibes de cordoba"
+        assert "name_key" not in new
+
+    def test_name_filter_is_an_anchored_prefix_on_the_key(self):
+        db = MagicMock()
+        db["communities"].find.return_value.limit.return_value.to_list = AsyncMock(
+            return_value=[]
+        )
+
+        asyncio.run(CommunityManager(db).get_by_name("Córdoba (1)"))
+
+        query = db["communities"].find.call_args[0][0]
+        assert query == {"name_key": {"$regex": "^cordoba\\ \\(1\\)"}}
+
+    def test_communities_without_name_key_are_backfilled(self):
+        db = MagicMock()
+        db["communities"].find = MagicMock(return_value=FakeCursor([
+            {"_id": "c1", "name": "Ñandú"},
+        ]))
+        db["communities"].bulk_write = AsyncMock()
+        db["communities"].create_index = AsyncMock()
+
+        asyncio.run(CommunityManager(db).ensure_indexes())
+
+        operation = db["communities"].bulk_write.call_args[0][0][0]
+        assert operation._doc == {"$set": {"name_key": "nandu"}}
+        db["communities"].create_index.assert_called_once_with("name_key", unique=True)
+
+    def test_duplicate_names_are_reported_when_the_index_fails(self):
+        db = MagicMock()
+        db["communities"].find = MagicMock(return_value=FakeCursor([]))
+        db["communities"].create_index = AsyncMock(
+            side_effect=DuplicateKeyError("E11000 duplicate key error")
+        )
+        db["communities"].aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"_id": "muller", "ids": ["c1", "c2"]},
+        ])
+
+        with self.assertRaises(RuntimeError) as error:
+            asyncio.run(CommunityManager(db).ensure_indexes())
+
+        assert "{'muller': ['c1', 'c2']}" in str(error.exception)
+
+
+class TestCommunitiesCount(unittest.TestCase):
+    def test_users_without_communities_count_are_backfilled(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock(return_value={"_id": "u1"})
+        db["communities"].aggregate.return_value.to_list = AsyncMock(return_value=[])
+        db["users"].update_many = AsyncMock()
+
+        asyncio.run(CommunityManager(db).ensure_communities_count())
+
+        merge = db["communities"].aggregate.call_args[0][0][-1]["$merge"]
+        assert merge["into"] == "users"
+        db["users"].update_many.assert_called_once()
+
+    def test_members_changed_by_update_are_recounted(self):
+        communities, users = MagicMock(), MagicMock()
+        db = MagicMock()
+        db.__getitem__.side_effect = {"communities": communities, "users": users}.__getitem__
+        communities.find_one_and_update = AsyncMock(return_value={"users": ["u1", "u2"]})
+        communities.aggregate.return_value.to_list = AsyncMock(return_value=[
+            {"_id": "u3", "communities_count": 2},
+        ])
+        communities.find_one = AsyncMock(return_value={
+            "_id": "6373d6d5a1a1b8bd2f1e2f40", "name": "c", "owner": "u1", "users": ["u1", "u3"],
+        })
+        users.bulk_write = AsyncMock()
+
+        asyncio.run(CommunityManager(db).update("c1", UpdateCommunityModel(users=["u1", "u3"])))
+
+        match = communities.aggregate.call_args[0][0][0]
+        assert match == {"$match": {"users": {"$in": ["u2", "u3"]}}}
+        operations = users.bulk_write.call_args[0][0]
+        assert [(op._filter, op._doc) for op in operations] == [
+            ({"_id": "u2"}, {"$set": {"communities_count": 0}}),
+            ({"_id": "u3"}, {"$set": {"communities_count": 2}}),
+        ]
+
+    def test_update_without_members_does_not_recount(self):
+        db = MagicMock()
+        db["communities"].update_one = AsyncMock()
+        db["communities"].find_one = AsyncMock(return_value={
+            "_id": "6373d6d5a1a1b8bd2f1e2f40", "name": "c", "owner": "u1",
+        })
+
+        asyncio.run(CommunityManager(db).update("c1", UpdateCommunityModel(description="d")))
+
+        db["communities"].aggregate.assert_not_called()
+
+
+class TestJoinCommunityUpdate(unittest.TestCase):
+    def test_join_checks_everything_in_the_update_filter(self):
+        db = MagicMock()
+        db["communities"].find_one_and_update = AsyncMock(return_value=None)
+
+        result = asyncio.run(CommunityManager(db).join_community("c1", "u1", "secret"))
+
+        assert result is None
+        query, update = db["communities"].find_one_and_update.call_args[0]
+        assert query == {
+            "_id": "c1",
+            "password": "secret",
+            "is_blocked": {"$ne": True},
+            "users": {"$ne": "u1"},
+            "users.10": {"$exists": False},
+        }
+        assert update == {"$addToSet": {"users": "u1"}}
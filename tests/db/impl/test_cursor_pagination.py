@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.db.impl.cursor_pagination import InvalidCursorError, after_query, decode_cursor, \
+    encode_cursor, paginate_by_keys
+
+
+def make_collection(documents):
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(
+        return_value=documents
+    )
+    collection.count_documents = AsyncMock(return_value=1000)
+    return collection
+
+
+class TestCursorPagination(unittest.TestCase):
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor([7, "abc"])
+
+        assert decode_cursor(cursor, ["number", "_id"]) == [7, "abc"]
+
+    def test_invalid_cursors(self):
+        for cursor in ["not a cursor", encode_cursor([1]), encode_cursor({"number": 1})]:
+            with self.assertRaises(InvalidCursorError):
+                decode_cursor(cursor, ["number", "_id"])
+
+    def test_after_query_breaks_ties_with_the_next_key(self):
+        assert after_query(["_id"], ["c1"]) == {"_id": {"$gt": "c1"}}
+        assert after_query(["number", "_id"], [7, "s1"]) == {"$or": [
+            {"number": {"$gt": 7}},
+            {"number": 7, "_id": {"$gt": "s1"}},
+        ]}
+
+    def test_first_page_without_total(self):
+        documents = [{"_id": f"s{i}", "number": i} for i in range(4)]
+        collection = make_collection(documents)
+
+        page = asyncio.run(paginate_by_keys(collection, {}, ["number", "_id"], 3))
+
+        assert [d["_id"] for d in page["items"]] == ["s0", "s1", "s2"]
+        assert decode_cursor(page["next_cursor"], ["number", "_id"]) == [2, "s2"]
+        assert page["total"] is None
+        collection.find.assert_called_once_with({})
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(4)
+        collection.count_documents.assert_not_called()
+
+    def test_next_page_is_filtered_by_the_cursor(self):
+        collection = make_collection([{"_id": "c9"}])
+        query = {"is_blocked": False}
+
+        page = asyncio.run(paginate_by_keys(
+            collection, query, ["_id"], 3, encode_cursor(["c8"]), with_total=True
+        ))
+
+        assert page["next_cursor"] is None
+        assert page["total"] == 1000
+        collection.find.assert_called_once_with({"$and": [query, {"_id": {"$gt": "c8"}}]})
+        collection.count_documents.assert_called_once_with(query)
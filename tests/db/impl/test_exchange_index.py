@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.db.impl.exchange_index import CommunityExchangeIndex, ExchangeIndex
+from app.db.impl.exchange_manager import ExchangeManager
+from app.db.model.exchange import ExchangeModel, UpdateExchangeModel
+
+
+def make_exchange(exchange_id: str, sender_id: str, stickers_to_receive, **kwargs) -> dict:
+    exchange = {
+        "_id": exchange_id,
+        "sender_id": sender_id,
+        "stickers_to_give": ["g1"],
+        "stickers_to_receive": stickers_to_receive,
+        "blacklist_user_ids": [],
+        "completed": False,
+    }
+    exchange.update(kwargs)
+    return exchange
+
+
+class TestCommunityExchangeIndex(unittest.TestCase):
+    def test_only_exchanges_asking_for_stickers_the_user_has(self):
+        index = CommunityExchangeIndex(["u1", "u2", "u3"], [
+            make_exchange("e1", "u2", ["s1"]),
+            make_exchange("e2", "u2", ["s1", "s2"]),
+            make_exchange("e3", "u3", ["s3"]),
+            make_exchange("e4", "u3", []),
+            make_exchange("e5", "u1", ["s1"]),
+            make_exchange("e6", "u3", ["s1"], blacklist_user_ids=["u1"]),
+        ])
+
+        available = index.available_for("u1", {"s1": 1, "s2": 0, "s4": 3})
+
+        assert [e["_id"] for e in available] == ["e1", "e4"]
+
+    def test_removed_exchanges_are_not_available(self):
+        index = CommunityExchangeIndex(["u1", "u2"], [make_exchange("e1", "u2", ["s1"])])
+
+        index.remove("e1")
+
+        assert index.available_for("u1", {"s1": 1}) == []
+        assert index.by_sticker == {}
+
+    def test_available_exchanges_are_copies(self):
+        index = CommunityExchangeIndex(["u1", "u2"], [make_exchange("e1", "u2", ["s1"])])
+
+        index.available_for("u1", {"s1": 1})[0]["stickers_to_receive"] = [{"_id": "s1"}]
+
+        assert index.exchanges["e1"]["stickers_to_receive"] == ["s1"]
+
+
+class TestExchangeIndex(unittest.TestCase):
+    def test_index_is_built_once_until_members_change(self):
+        exchange_index = ExchangeIndex()
+        load = AsyncMock(return_value=[make_exchange("e1", "u2", ["s1"])])
+
+        asyncio.run(exchange_index.get("c1", ["u1", "u2"], load))
+        asyncio.run(exchange_index.get("c1", ["u2", "u1"], load))
+        assert load.call_count == 1
+
+        asyncio.run(exchange_index.get("c1", ["u1", "u2", "u3"], load))
+        assert load.call_count == 2
+        load.assert_called_with(["u1", "u2", "u3"])
+
+    def test_expired_index_is_rebuilt(self):
+        exchange_index = ExchangeIndex(ttl=-1)
+        load = AsyncMock(return_value=[])
+
+        asyncio.run(exchange_index.get("c1", ["u1"], load))
+        asyncio.run(exchange_index.get("c1", ["u1"], load))
+
+        assert load.call_count == 2
+
+    def test_manager_keeps_the_index_up_to_date(self):
+        exchange_index = ExchangeIndex()
+        db = MagicMock()
+        db["exchanges"].find.return_value.to_list = AsyncMock(return_value=[])
+        db["exchanges"].insert_one = AsyncMock()
+        db["exchanges"].update_one = AsyncMock()
+        manager = ExchangeManager(db, index=exchange_index)
+
+        def available():
+            return asyncio.run(manager.get_available_exchanges(
+                "c1", ["u1", "u2"], "u1", {"s1": 1}
+            ))
+
+        assert available() == []
+
+        exchange = ExchangeModel(sender_id="u2", stickers_to_give=["g1"],
+                                 stickers_to_receive=["s1"])
+        asyncio.run(manager.add_new(exchange))
+        assert [e["sender_id"] for e in available()] == ["u2"]
+
+        db["exchanges"].find_one = AsyncMock(return_value={
+            **exchange.dict(by_alias=True), "_id": str(exchange.id), "completed": True,
+        })
+        asyncio.run(manager.update(str(exchange.id), UpdateExchangeModel(completed=True)))
+        assert available() == []
+        assert db["exchanges"].find.call_count == 1
+        # Every pending exchange of the members, however many each one has
+        db["exchanges"].find.return_value.to_list.assert_called_once_with(None)
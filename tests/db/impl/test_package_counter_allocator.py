@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from app.db.impl.package_counter_allocator import PackageCounterAllocator
+
+
+class FakePackageCounterCollection:
+    def __init__(self, counter: int = 0):
+        self.counter = counter
+        self.calls = 0
+
+    async def find_one_and_update(self, query, update, upsert, return_document):
+        self.calls += 1
+        # Let other coroutines run as a real round trip would
+        await asyncio.sleep(0)
+        self.counter += update["$inc"]["counter"]
+        return {"counter": self.counter}
+
+
+def make_db(collection):
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: collection
+    return db
+
+
+class TestPackageCounterAllocator(unittest.TestCase):
+    def test_allocates_consecutive_numbers_with_one_round_trip_per_block(self):
+        collection = FakePackageCounterCollection(counter=5)
+        allocator = PackageCounterAllocator(make_db(collection), block_size=11)
+
+        numbers = [asyncio.run(allocator.allocate()) for _ in range(22)]
+
+        assert numbers == list(range(5, 27))
+        assert collection.calls == 2
+
+    def test_concurrent_workers_never_share_a_number(self):
+        collection = FakePackageCounterCollection()
+        workers = [PackageCounterAllocator(make_db(collection), block_size=11)
+                   for _ in range(3)]
+
+        async def run():
+            tasks = [w.allocate() for w in workers for _ in range(100)]
+            return await asyncio.gather(*tasks)
+
+        numbers = asyncio.run(run())
+
+        assert len(numbers) == 300
+        assert len(set(numbers)) == 300
+        # Every number reserved was handed out except the tail of the last blocks
+        assert collection.counter - 300 < 3 * 11
+
+    def test_special_package_cadence_is_kept(self):
+        collection = FakePackageCounterCollection()
+        workers = [PackageCounterAllocator(make_db(collection), block_size=11)
+                   for _ in range(2)]
+
+        async def run():
+            tasks = [w.allocate() for w in workers for _ in range(110)]
+            return await asyncio.gather(*tasks)
+
+        numbers = asyncio.run(run())
+        specials = [n for n in numbers if n % 11 == 0 and n != 0]
+
+        assert len(specials) == 19
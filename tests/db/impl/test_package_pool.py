@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock
+
+from app.db.impl.package_pool import PackagePool
+from app.db.impl.sticker_catalog import StickerCatalog
+from app.db.model.package import PackageModel
+
+
+def make_pool(**kwargs):
+    builder = AsyncMock(side_effect=lambda special: PackageModel(stickers=[]))
+    pool = PackagePool(builder, StickerCatalog(), **kwargs)
+    return pool, builder
+
+
+class TestPackagePool(unittest.TestCase):
+    def test_builds_package_when_pool_is_empty(self):
+        pool, builder = make_pool()
+
+        package = asyncio.run(pool.get(False))
+
+        assert package is not None
+        builder.assert_called_once_with(False)
+        assert pool.misses == 1
+        assert pool.hits == 0
+
+    def test_refill_tops_up_both_pools_to_high_watermark(self):
+        pool, builder = make_pool(low_watermark=2, high_watermark=5,
+                                  special_low_watermark=1, special_high_watermark=2)
+
+        asyncio.run(pool.refill())
+
+        assert pool.size(False) == 5
+        assert pool.size(True) == 2
+        assert pool.generated == 7
+
+    def test_refill_waits_for_low_watermark(self):
+        pool, builder = make_pool(low_watermark=2, high_watermark=5,
+                                  special_low_watermark=1, special_high_watermark=2)
+        asyncio.run(pool.refill())
+        asyncio.run(pool.get(False))
+        asyncio.run(pool.get(False))
+
+        asyncio.run(pool.refill())
+        assert pool.size(False) == 3
+
+        asyncio.run(pool.get(False))
+        asyncio.run(pool.get(False))
+        asyncio.run(pool.refill())
+        assert pool.size(False) == 5
+
+    def test_get_pops_prebuilt_package_of_requested_shape(self):
+        pool, builder = make_pool(low_watermark=1, high_watermark=1,
+                                  special_low_watermark=1, special_high_watermark=1)
+        asyncio.run(pool.refill())
+        builder.reset_mock()
+
+        asyncio.run(pool.get(True))
+
+        builder.assert_not_called()
+        assert pool.size(True) == 0
+        assert pool.size(False) == 1
+        assert pool.hits == 1
+
+    def test_packages_built_before_catalog_change_are_discarded(self):
+        pool, builder = make_pool(low_watermark=1, high_watermark=3)
+        asyncio.run(pool.refill())
+        builder.reset_mock()
+
+        pool.catalog.invalidate()
+        asyncio.run(pool.get(False))
+
+        builder.assert_called_once_with(False)
+        assert pool.discarded == 3
+        assert pool.size(False) == 0
+
+    def test_background_task_fills_pool(self):
+        pool, builder = make_pool(low_watermark=1, high_watermark=3,
+                                  special_low_watermark=1, special_high_watermark=1)
+
+        async def run():
+            pool.start()
+            await asyncio.sleep(0.05)
+            await pool.stop()
+
+        asyncio.run(run())
+
+        assert pool.size(False) == 3
+        assert pool.size(True) == 1
+        assert pool.metrics()["running"] is False
+
+    def test_packages_taken_while_refilling_trigger_another_refill(self):
+        pool, builder = make_pool(low_watermark=2, high_watermark=3,
+                                  special_low_watermark=1, special_high_watermark=1,
+                                  refill_interval=60)
+
+        async def build(special):
+            if special and pool.size(False) == 3:
+                # Two requests take normal packages after that pool was refilled
+                await pool.get(False)
+                await pool.get(False)
+            return PackageModel(stickers=[])
+
+        builder.side_effect = build
+
+        async def run():
+            pool.start()
+            await asyncio.sleep(0.05)
+            await pool.stop()
+
+        asyncio.run(run())
+
+        assert pool.size(False) == 3
+        assert pool.size(True) == 1
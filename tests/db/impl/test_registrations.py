@@ -0,0 +1,53 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.db.impl.user_manager import UserManager, REGISTRATIONS_DAILY, to_model
+from tests.factories import FakeCursor, make_user
+
+
+def make_db(days, previous=None):
+    users = MagicMock()
+    users.insert_one = AsyncMock()
+    registrations = MagicMock()
+    registrations.update_one = AsyncMock()
+    registrations.find = MagicMock(return_value=FakeCursor(days))
+    registrations.aggregate.return_value.to_list = AsyncMock(
+        return_value=[] if previous is None else [{"_id": None, "count": previous}]
+    )
+    collections = {"users": users, REGISTRATIONS_DAILY: registrations}
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: collections[name]
+    return db
+
+
+class TestRegistrationsDaily(unittest.TestCase):
+    def test_new_user_increments_its_register_date(self):
+        db = make_db([])
+
+        asyncio.run(UserManager(db).add_new(to_model(make_user(register_date="2022-11-27"))))
+
+        db[REGISTRATIONS_DAILY].update_one.assert_called_once_with(
+            {"_id": "2022-11-27"}, {"$inc": {"count": 1}}, upsert=True
+        )
+
+    def test_register_info_is_cumulative(self):
+        db = make_db([
+            {"_id": "2022-11-25", "count": 2},
+            {"_id": "2022-11-27", "count": 3},
+        ])
+
+        info = asyncio.run(UserManager(db).get_register_info())
+
+        assert info == {"2022-11-25": 2, "2022-11-27": 5}
+        db[REGISTRATIONS_DAILY].aggregate.assert_not_called()
+
+    def test_register_info_range_starts_from_the_previous_total(self):
+        db = make_db([{"_id": "2022-11-27", "count": 3}], previous=10)
+
+        info = asyncio.run(UserManager(db).get_register_info("2022-11-26", "2022-11-30"))
+
+        assert info == {"2022-11-27": 13}
+        assert db[REGISTRATIONS_DAILY].find.call_args[0][0] == {
+            "_id": {"$gte": "2022-11-26", "$lte": "2022-11-30"}
+        }
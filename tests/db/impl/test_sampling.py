@@ -0,0 +1,90 @@
+import random
+import timeit
+import unittest
+from collections import Counter
+
+from app.db.impl.sampling import sample_positions, sample_without_replacement
+from benchmarks.sampling_benchmark import legacy_random_stickers_from_list
+
+# Chi-square critical values for p = 0.001
+CHI2_CRITICAL_19_DF = 43.82
+CHI2_CRITICAL_29_DF = 58.30
+
+DRAWS = 20000
+
+
+def chi_square(observed: Counter, expected: float, categories) -> float:
+    return sum((observed[c] - expected) ** 2 / expected for c in categories)
+
+
+def chi_square_homogeneity(a: Counter, b: Counter, categories) -> float:
+    total_a = sum(a.values())
+    total_b = sum(b.values())
+    result = 0.
+    for c in categories:
+        row = a[c] + b[c]
+        for observed, total in [(a[c], total_a), (b[c], total_b)]:
+            expected = row * total / (total_a + total_b)
+            result += (observed - expected) ** 2 / expected
+    return result
+
+
+class TestSampling(unittest.TestCase):
+    def test_positions_are_different_and_in_range(self):
+        rng = random.Random(1)
+        for size in [1, 5, 10, 600]:
+            positions = sample_positions(size, 5, rng)
+            assert len(positions) == min(5, size)
+            assert len(set(positions)) == len(positions)
+            assert all(0 <= p < size for p in positions)
+
+    def test_empty_population(self):
+        assert sample_without_replacement([], 5) == []
+
+    def test_same_seed_reproduces_the_draw(self):
+        items = list(range(10000))
+        first = sample_without_replacement(items, 5, random.Random(42))
+        second = sample_without_replacement(items, 5, random.Random(42))
+        assert first == second
+
+
+class TestSamplingDistribution(unittest.TestCase):
+    def test_every_item_is_equally_likely_to_be_selected(self):
+        rng = random.Random(2022)
+        items = list(range(20))
+        counter = Counter()
+        for _ in range(DRAWS):
+            counter.update(sample_without_replacement(items, 5, rng))
+
+        assert chi_square(counter, DRAWS * 5 / 20, items) < CHI2_CRITICAL_19_DF
+
+    def test_every_ordered_pair_is_equally_likely(self):
+        rng = random.Random(2022)
+        items = list(range(6))
+        counter = Counter()
+        for _ in range(DRAWS):
+            counter[tuple(sample_without_replacement(items, 2, rng))] += 1
+
+        pairs = [(a, b) for a in items for b in items if a != b]
+        assert chi_square(counter, DRAWS / len(pairs), pairs) < CHI2_CRITICAL_29_DF
+
+    def test_distribution_matches_previous_implementation(self):
+        items = list(range(20))
+        legacy_rng = random.Random(11)
+        new_rng = random.Random(12)
+        legacy = Counter()
+        new = Counter()
+        for _ in range(DRAWS):
+            legacy.update(legacy_random_stickers_from_list(items, 5, legacy_rng))
+            new.update(sample_without_replacement(items, 5, new_rng))
+
+        assert chi_square_homogeneity(legacy, new, items) < CHI2_CRITICAL_19_DF
+
+    def test_faster_than_previous_implementation_on_big_catalogs(self):
+        items = list(range(10000))
+        rng = random.Random(0)
+        legacy = timeit.timeit(
+            lambda: legacy_random_stickers_from_list(items, 5, rng), number=5
+        )
+        new = timeit.timeit(lambda: sample_without_replacement(items, 5, rng), number=5)
+        assert new * 10 < legacy
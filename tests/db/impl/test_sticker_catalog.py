@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.db.impl.sticker_catalog import StickerCatalog
+from app.db.impl.sticker_manager import StickerManager
+from tests.factories import make_sticker
+
+
+def make_db(stickers, counter: int = 1):
+    db = MagicMock()
+    db["stickers"].find.return_value.to_list = AsyncMock(return_value=stickers)
+    db["package-counter"].find_one_and_update = AsyncMock(
+        return_value={"counter": counter + 11}
+    )
+    return db
+
+
+class TestStickerCatalog(unittest.TestCase):
+    def test_build_buckets_stickers_by_weight(self):
+        catalog = StickerCatalog()
+        catalog.build([make_sticker(1), make_sticker(1), make_sticker(3)])
+
+        assert len(catalog.bucket(1)) == 2
+        assert len(catalog.bucket(3)) == 1
+        assert catalog.bucket(5) == []
+
+    def test_sample_returns_different_stickers_from_the_given_weights(self):
+        catalog = StickerCatalog()
+        catalog.build([make_sticker(w) for w in [1, 1, 2, 3, 4, 5]])
+
+        for _ in range(50):
+            result = catalog.sample([1, 2, 3], 3)
+            assert len(result) == 3
+            assert len({s.id for s in result}) == 3
+            assert all(s.weight in [1, 2, 3] for s in result)
+
+    def test_sample_is_bounded_by_the_available_stickers(self):
+        catalog = StickerCatalog()
+        catalog.build([make_sticker(4)])
+
+        assert len(catalog.sample([4, 5], 5)) == 1
+        assert catalog.sample([1], 2) == []
+
+    def test_invalidate_makes_catalog_stale(self):
+        db = make_db([make_sticker(1)])
+        catalog = StickerCatalog()
+
+        asyncio.run(catalog.ensure_loaded(db))
+        asyncio.run(catalog.ensure_loaded(db))
+        assert db["stickers"].find.call_count == 1
+        assert not catalog.is_stale()
+
+        catalog.invalidate()
+        assert catalog.is_stale()
+        asyncio.run(catalog.ensure_loaded(db))
+        assert db["stickers"].find.call_count == 2
+
+
+class TestCreatePackageFromCatalog(unittest.TestCase):
+    def test_normal_package_does_not_read_stickers_once_loaded(self):
+        stickers = [make_sticker(w, i) for i, w in enumerate([1, 1, 2, 2, 3, 3, 4, 5])]
+        db = make_db(stickers, counter=3)
+        manager = StickerManager(db, catalog=StickerCatalog())
+
+        for _ in range(5):
+            package = asyncio.run(manager.create_package())
+            assert len(package.stickers) == 5
+            assert all(s.weight <= 3 for s in package.stickers)
+
+        assert db["stickers"].find.call_count == 1
+
+    def test_normal_package_completes_with_higher_weights(self):
+        stickers = [make_sticker(w, i) for i, w in enumerate([1, 2, 4, 5, 5])]
+        manager = StickerManager(make_db(stickers, counter=3), catalog=StickerCatalog())
+
+        package = asyncio.run(manager.create_package())
+
+        assert len({s.id for s in package.stickers}) == 5
+
+    def test_special_package(self):
+        stickers = [make_sticker(w, i) for i, w in enumerate([1, 1, 1, 2, 3, 4, 5])]
+        manager = StickerManager(make_db(stickers, counter=11), catalog=StickerCatalog())
+
+        package = asyncio.run(manager.create_package())
+
+        weights = [s.weight for s in package.stickers]
+        assert weights[0] == 5
+        assert weights[1:3] == [1, 1]
+        assert all(1 <= w <= 4 for w in weights[3:])
+
+    def test_create_sticker_invalidates_catalog(self):
+        db = make_db([])
+        db["stickers"].insert_one = AsyncMock()
+        catalog = StickerCatalog()
+        asyncio.run(catalog.ensure_loaded(db))
+        manager = StickerManager(db, catalog=catalog)
+
+        asyncio.run(manager.create_sticker(make_sticker(1)))
+
+        assert catalog.is_stale()
+
+
+class TestGetStickersByIds(unittest.TestCase):
+    def test_stickers_come_from_the_catalog_and_one_query_for_the_rest(self):
+        cached = make_sticker(1, 1)
+        missing = make_sticker(2, 2)
+        db = make_db([cached])
+        catalog = StickerCatalog()
+        asyncio.run(catalog.ensure_loaded(db))
+        db["stickers"].find.return_value.to_list = AsyncMock(return_value=[missing])
+        manager = StickerManager(db, catalog=catalog)
+
+        stickers = asyncio.run(manager.get_by_ids(
+            [cached["_id"], missing["_id"], cached["_id"]]
+        ))
+
+        assert set(stickers.keys()) == {cached["_id"], missing["_id"]}
+        db["stickers"].find.assert_called_with({"_id": {"$in": [missing["_id"]]}})
@@ -0,0 +1,189 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from pymongo.errors import BulkWriteError
+
+from app.db.impl.sticker_catalog import StickerCatalog
+from app.db.impl.sticker_metrics_writer import StickerMetricsWriter, STICKERS_METRICS_REPORT
+from tests.factories import make_sticker
+
+
+def make_db():
+    collections = {
+        "stickers_metrics": MagicMock(),
+        STICKERS_METRICS_REPORT: MagicMock(),
+        "package-counter": MagicMock(),
+    }
+    for collection in collections.values():
+        collection.bulk_write = AsyncMock()
+    collections["package-counter"].update_one = AsyncMock()
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    return db
+
+
+def make_writer(catalog: StickerCatalog = None, **kwargs):
+    db = make_db()
+    writer = StickerMetricsWriter(db, catalog or StickerCatalog(), **kwargs)
+    return writer, db["stickers_metrics"].bulk_write
+
+
+class TestStickerMetricsWriter(unittest.TestCase):
+    def test_record_aggregates_deltas_per_sticker(self):
+        writer, bulk_write = make_writer()
+
+        writer.record(["s1", "s2", "s3"])
+        writer.record(["s1", "s4"])
+
+        assert writer.pending == {"s1": 2, "s2": 1, "s3": 1, "s4": 1}
+        bulk_write.assert_not_called()
+
+    def test_flush_writes_one_unordered_bulk_of_upserts(self):
+        writer, bulk_write = make_writer()
+        writer.record(["s1", "s2"])
+        writer.record(["s1"])
+
+        asyncio.run(writer.flush())
+
+        bulk_write.assert_called_once()
+        operations = bulk_write.call_args[0][0]
+        assert bulk_write.call_args[1] == {"ordered": False}
+        docs = {op._filter["sticker_id"]: op._doc for op in operations}
+        assert docs == {"s1": {"$inc": {"counter": 2}}, "s2": {"$inc": {"counter": 1}}}
+        assert all(op._upsert for op in operations)
+        assert len(writer.pending) == 0
+
+    def test_flush_counts_the_opened_packages(self):
+        writer, _ = make_writer()
+        update_one = writer.db["package-counter"].update_one
+        writer.record(["s1", "s2"])
+        writer.record(["s1"])
+
+        asyncio.run(writer.flush())
+
+        update_one.assert_called_once_with({}, {"$inc": {"opened": 2}})
+        assert writer.pending_packages == 0
+
+    def test_failed_package_count_is_retried(self):
+        writer, bulk_write = make_writer()
+        update_one = writer.db["package-counter"].update_one
+        update_one.side_effect = Exception("mongo died")
+        writer.record(["s1"])
+
+        asyncio.run(writer.flush())
+        update_one.side_effect = None
+        asyncio.run(writer.flush())
+
+        assert update_one.call_args[0][1] == {"$inc": {"opened": 1}}
+        assert bulk_write.call_count == 1
+        assert writer.pending_packages == 0
+
+    def test_flush_without_pending_metrics_does_not_write(self):
+        writer, bulk_write = make_writer()
+
+        asyncio.run(writer.flush())
+
+        bulk_write.assert_not_called()
+
+    def test_failed_flush_keeps_counts_for_next_flush(self):
+        writer, bulk_write = make_writer()
+        bulk_write.side_effect = Exception("mongo died")
+        writer.record(["s1", "s2"])
+
+        asyncio.run(writer.flush())
+        writer.record(["s1"])
+
+        assert writer.pending == {"s1": 2, "s2": 1}
+
+    def test_only_failed_upserts_are_retried(self):
+        writer, bulk_write = make_writer()
+        bulk_write.side_effect = BulkWriteError({"writeErrors": [{"index": 1}]})
+        writer.record(["s1", "s2"])
+
+        asyncio.run(writer.flush())
+
+        assert writer.pending == {"s2": 1}
+
+    def test_threshold_triggers_flush_and_stop_flushes_pending(self):
+        writer, bulk_write = make_writer(flush_interval=60, flush_threshold=2)
+
+        async def run():
+            writer.start()
+            writer.record(["s1", "s2"])
+            await asyncio.sleep(0.01)
+            assert bulk_write.call_count == 1
+            writer.record(["s3"])
+            await writer.stop()
+
+        asyncio.run(run())
+
+        assert bulk_write.call_count == 2
+        assert len(writer.pending) == 0
+
+    def test_flush_applies_deltas_to_report_with_sticker_metadata(self):
+        sticker = make_sticker(1, number=10)
+        catalog = StickerCatalog()
+        catalog.build([sticker])
+        writer, _ = make_writer(catalog)
+        report_bulk_write = writer.db[STICKERS_METRICS_REPORT].bulk_write
+        writer.record([sticker["_id"], "unknown"])
+        writer.record([sticker["_id"]])
+
+        asyncio.run(writer.flush())
+
+        operations = report_bulk_write.call_args[0][0]
+        docs = {op._filter["_id"]: op._doc for op in operations}
+        assert docs[sticker["_id"]] == {
+            "$inc": {"counter": 2},
+            "$set": {"name": "player 10", "number": 10, "country": "ARG"},
+        }
+        assert docs["unknown"] == {"$inc": {"counter": 1}}
+
+    def test_report_is_not_updated_for_metrics_that_failed(self):
+        writer, bulk_write = make_writer()
+        report_bulk_write = writer.db[STICKERS_METRICS_REPORT].bulk_write
+        bulk_write.side_effect = BulkWriteError({"writeErrors": [{"index": 0}]})
+        writer.record(["s1", "s2"])
+
+        asyncio.run(writer.flush())
+
+        operations = report_bulk_write.call_args[0][0]
+        assert [op._filter["_id"] for op in operations] == ["s2"]
+
+        bulk_write.side_effect = Exception("mongo died")
+        report_bulk_write.reset_mock()
+        asyncio.run(writer.flush())
+        report_bulk_write.assert_not_called()
+
+    def test_failed_report_updates_are_retried_on_next_flush(self):
+        writer, bulk_write = make_writer()
+        report_bulk_write = writer.db[STICKERS_METRICS_REPORT].bulk_write
+        report_bulk_write.side_effect = Exception("mongo died")
+        writer.record(["s1", "s2"])
+        asyncio.run(writer.flush())
+
+        report_bulk_write.side_effect = None
+        writer.record(["s1"])
+        asyncio.run(writer.flush())
+
+        operations = report_bulk_write.call_args[0][0]
+        docs = {op._filter["_id"]: op._doc for op in operations}
+        assert docs == {"s1": {"$inc": {"counter": 2}}, "s2": {"$inc": {"counter": 1}}}
+        assert len(writer.pending_report) == 0
+
+    def test_only_failed_report_updates_are_retried(self):
+        writer, bulk_write = make_writer()
+        report_bulk_write = writer.db[STICKERS_METRICS_REPORT].bulk_write
+        report_bulk_write.side_effect = BulkWriteError({"writeErrors": [{"index": 1}]})
+        writer.record(["s1", "s2"])
+        asyncio.run(writer.flush())
+
+        assert writer.pending_report == {"s2": 1}
+
+        report_bulk_write.side_effect = None
+        asyncio.run(writer.flush())
+
+        operations = report_bulk_write.call_args[0][0]
+        assert [op._filter["_id"] for op in operations] == ["s2"]
+        assert bulk_write.call_count == 1
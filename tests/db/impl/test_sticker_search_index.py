@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.db.impl.sticker_catalog import StickerCatalog
+from app.db.impl.sticker_manager import StickerManager
+from app.db.impl.sticker_search_index import StickerSearchIndex
+from app.db.impl.text_normalization import fold
+from tests.factories import make_sticker
+
+
+def make_index():
+    index = StickerSearchIndex()
+    index.add("1", "Lionel Messi")
+    index.add("2", "Thomas Müller")
+    index.add("3", "Ángel Di María")
+    index.add("4", "Lisandro Martínez")
+    return index
+
+
+class TestStickerSearchIndex(unittest.TestCase):
+    def test_fold_ignores_case_accents_and_extra_spaces(self):
+        assert fold("  Thomas  MÜLLER ") == "thomas muller"
+        assert fold("Ángel Di María") == "angel di maria"
+
+    def test_substring_search(self):
+        index = make_index()
+
+        assert index.search("messi") == ["1"]
+        assert index.search("ESS") == ["1"]
+        assert sorted(index.search("mar")) == ["3", "4"]
+        assert index.search("zzz") == []
+
+    def test_search_ignores_accents(self):
+        index = make_index()
+
+        assert index.search("muller") == ["2"]
+        assert index.search("Müll") == ["2"]
+        assert index.search("angel di") == ["3"]
+
+    def test_trigrams_must_be_contiguous(self):
+        index = StickerSearchIndex()
+        index.add("1", "abcxbcd")
+
+        assert index.search("abcd") == []
+
+    def test_short_queries_match_word_prefixes(self):
+        index = make_index()
+
+        assert sorted(index.search("l")) == ["1", "4"]
+        assert sorted(index.search("Ma")) == ["3", "4"]
+        assert index.search("di") == ["3"]
+        assert index.search("x") == []
+
+    def test_empty_query_returns_everything(self):
+        assert sorted(make_index().search(" ")) == ["1", "2", "3", "4"]
+
+    def test_update_and_remove(self):
+        index = make_index()
+
+        index.add("1", "Leo Messi")
+        assert index.search("lionel") == []
+        assert index.search("leo") == ["1"]
+
+        index.remove("1")
+        assert index.search("messi") == []
+        assert index.search("le") == []
+
+
+class TestSearchStickersByName(unittest.TestCase):
+    def test_get_all_resolves_ids_from_index(self):
+        messi = make_sticker(1)
+        messi["name"] = "Lionel Messi"
+        muller = make_sticker(1)
+        muller["name"] = "Thomas Müller"
+        db = MagicMock()
+        db["stickers"].find.return_value.to_list = AsyncMock(return_value=[messi, muller])
+        manager = StickerManager(db, catalog=StickerCatalog())
+
+        ids = asyncio.run(manager.search_by_name("MULLER"))
+
+        assert ids == [muller["_id"]]
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from app.db.impl.user_manager import UserManager, count_stickers, to_model
+from app.db.model.my_sticker import MyStickerModel
+from app.db.model.user import UpdateUserModel
+from tests.factories import FakeCursor, make_user
+
+
+class TestUserStatistics(unittest.TestCase):
+    def test_count_stickers(self):
+        assert count_stickers(make_user()["stickers"]) == {
+            "stickers_on_album": 1,
+            "stickers_collected": 4,
+        }
+
+    def test_stored_statistics_are_used_as_they_are(self):
+        user = to_model(make_user(stickers_on_album=10, stickers_collected=30))
+
+        assert user.stickers_on_album == 10
+        assert user.stickers_collected == 30
+
+    def test_statistics_are_computed_for_users_not_migrated(self):
+        user = to_model(make_user(stickers_collected=0))
+
+        assert user.stickers_on_album == 1
+        assert user.stickers_collected == 4
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_get_by_id_calculates_completion_from_stored_counter(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock(
+            return_value=make_user(stickers_on_album=5, stickers_collected=9)
+        )
+
+        user = asyncio.run(UserManager(db).get_by_id("1"))
+
+        assert user.album_completion_pct == 25
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_update_with_stickers_writes_statistics(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=make_user())
+        stickers = [MyStickerModel(id="s1", is_on_album=True, quantity=3)]
+
+        asyncio.run(UserManager(db).update("1", UpdateUserModel(stickers=stickers)))
+
+        update = db["users"].find_one_and_update.call_args[0][1]["$set"]
+        assert update["stickers_on_album"] == 1
+        assert update["stickers_collected"] == 4
+
+    def test_repair_fixes_only_wrong_statistics(self):
+        users = [
+            make_user(_id="1", stickers_on_album=1, stickers_collected=4),
+            make_user(_id="2", stickers_on_album=0, stickers_collected=4),
+            make_user(_id="3"),
+        ]
+        db = MagicMock()
+        db["users"].find = MagicMock(return_value=FakeCursor(users))
+        db["users"].bulk_write = AsyncMock()
+
+        result = asyncio.run(UserManager(db).repair_statistics(batch_size=1))
+
+        assert result == {"checked": 3, "repaired": 2}
+        assert db["users"].bulk_write.call_count == 2
+        repaired = [call[0][0][0]._filter["_id"] for call in db["users"].bulk_write.call_args_list]
+        assert repaired == ["2", "3"]
@@ -0,0 +1,385 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.db.impl.user_manager import UserManager, build_user_update, daily_package_date, to_model
+from app.db.model.my_sticker import MyStickerModel
+from app.db.model.package import PackageModel
+from app.db.model.sticker import StickerModel
+from tests.factories import FakeCursor, make_sticker, make_user
+
+
+def make_package(amount: int = 5) -> PackageModel:
+    return PackageModel(stickers=[StickerModel(**make_sticker(1, i)) for i in range(amount)])
+
+
+class TestOpenPackage(unittest.TestCase):
+    def test_has_packages_only_reads_the_id(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock(return_value=None)
+
+        assert asyncio.run(UserManager(db).has_packages("u1")) is False
+        db["users"].find_one.assert_called_once_with(
+            {"_id": "u1", "package_counter": {"$gt": 0}}, {"_id": 1}
+        )
+
+    def test_open_package_is_one_update_returning_the_user(self):
+        package = make_package()
+        ids = [str(s.id) for s in package.stickers]
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value={
+            "_id": "u1",
+            "stickers": [{"id": "other", "quantity": 3, "is_on_album": True}] + [
+                {"id": sid, "quantity": i + 1, "is_on_album": False}
+                for i, sid in enumerate(ids)
+            ],
+        })
+
+        result = asyncio.run(UserManager(db).open_package("u1", package))
+
+        db["users"].find_one_and_update.assert_called_once()
+        query, update = db["users"].find_one_and_update.call_args[0]
+        assert query == {"_id": "u1", "package_counter": {"$gt": 0}}
+        assert update[0]["$set"]["stickers_collected"]["$add"][1] == 5
+        assert [r.id for r in result] == ids
+        assert [r.quantity for r in result] == [1, 2, 3, 4, 5]
+        assert result[0].name == package.stickers[0].name
+
+    def test_open_package_without_packages_fails(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=None)
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(UserManager(db).open_package("u1", make_package()))
+
+        assert context.exception.status_code == 400
+
+
+class TestPasteSticker(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_paste_is_a_conditional_update_of_the_sticker(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=make_user(
+            stickers=[{"id": "s1", "is_on_album": True, "quantity": 0}],
+            stickers_on_album=1,
+            stickers_collected=1,
+        ))
+
+        user = asyncio.run(UserManager(db).paste_sticker("u1", "s1"))
+
+        query, update = db["users"].find_one_and_update.call_args[0]
+        assert query["stickers"]["$elemMatch"] == {
+            "id": "s1", "is_on_album": False, "quantity": {"$gt": 0}
+        }
+        assert update == {
+            "$set": {"stickers.$.is_on_album": True},
+            "$inc": {"stickers.$.quantity": -1, "stickers_on_album": 1},
+        }
+        assert user.stickers[0].is_on_album is True
+        assert user.album_completion_pct == 10
+        db["users"].find_one.assert_not_called()
+
+    def test_paste_already_pasted_sticker_fails(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=None)
+        db["users"].find_one = AsyncMock(return_value={
+            "_id": "u1", "stickers": [{"id": "s1", "is_on_album": True, "quantity": 1}]
+        })
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(UserManager(db).paste_sticker("u1", "s1"))
+
+        assert context.exception.detail == "Sticker s1 is already pasted"
+
+    def test_paste_sticker_without_quantity_fails(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=None)
+        db["users"].find_one = AsyncMock(return_value={
+            "_id": "u1", "stickers": [{"id": "s1", "is_on_album": False, "quantity": 0}]
+        })
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(UserManager(db).paste_sticker("u1", "s1"))
+
+        assert context.exception.detail == "Sticker quantity for s1 is 0"
+
+
+class TestUpdateUser(unittest.TestCase):
+    def test_only_changed_fields_are_sent(self):
+        user = to_model(make_user(package_counter=1, stickers_on_album=1, stickers_collected=4))
+        user.package_counter += 2
+        user.country = "ARG"
+
+        assert build_user_update(user) == {
+            "$inc": {"package_counter": 2},
+            "$set": {"country": "ARG"},
+        }
+
+    def test_changed_stickers_are_updated_by_position(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+        user.stickers[0].quantity -= 1
+        user.stickers[1].is_on_album = True
+        user.exchanges_amount += 1
+
+        assert build_user_update(user) == {
+            "$inc": {
+                "stickers.0.quantity": -1,
+                "stickers_on_album": 1,
+                "exchanges_amount": 1,
+            },
+            "$set": {"stickers.1.is_on_album": True},
+        }
+
+    def test_new_stickers_are_pushed(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+        user.stickers.append(MyStickerModel(id="s3", quantity=1, is_on_album=False))
+
+        assert build_user_update(user) == {
+            "$push": {"stickers": {"$each": [{"id": "s3", "is_on_album": False, "quantity": 1}]}},
+            "$inc": {"stickers_collected": 1},
+        }
+
+    def test_changed_and_new_stickers_are_one_pipeline_by_id(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+        # An exchange: the receiver gives s1 and gets s3
+        user.stickers[0].quantity -= 1
+        user.stickers.append(MyStickerModel(id="s3", quantity=1, is_on_album=False))
+        user.exchanges_amount += 1
+
+        update = build_user_update(user)
+
+        assert len(update) == 1
+        stage = update[0]["$set"]
+        stickers_map, added = stage["stickers"]["$concatArrays"]
+        branches = stickers_map["$map"]["in"]["$switch"]["branches"]
+        assert branches[0] == {
+            "case": {"$eq": ["$$s.id", "s1"]},
+            "then": {"$mergeObjects": ["$$s", {"quantity": {"$add": ["$$s.quantity", -1]}}]},
+        }
+        # s3 pushed by a concurrent update gets the copy instead of being repeated
+        assert branches[1]["case"] == {"$eq": ["$$s.id", "s3"]}
+        assert added["$filter"]["input"] == {
+            "$literal": [{"id": "s3", "is_on_album": False, "quantity": 1}]
+        }
+        assert "stickers_collected" not in stage
+        assert stage["exchanges_amount"] == {
+            "$add": [{"$ifNull": ["$exchanges_amount", 0]}, 1]
+        }
+
+    def test_pasted_and_new_stickers_change_the_counters(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+        user.stickers[1].quantity -= 1
+        user.stickers[1].is_on_album = True
+        user.stickers.append(MyStickerModel(id="s3", quantity=2, is_on_album=False))
+        user.country = "$ARG"
+
+        stage = build_user_update(user)[0]["$set"]
+
+        fields = stage["stickers"]["$concatArrays"][0]["$map"]["in"]["$switch"]["branches"][0]
+        assert fields["then"]["$mergeObjects"][1]["is_on_album"] is True
+        assert stage["stickers_on_album"] == {"$add": [{"$ifNull": ["$stickers_on_album", 0]}, 1]}
+        assert stage["stickers_collected"] == {
+            "$add": [{"$ifNull": ["$stickers_collected", 0]}, 2]
+        }
+        assert stage["country"] == {"$literal": "$ARG"}
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_update_returns_the_user_without_reading_it_again(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=make_user(
+            package_counter=3, stickers_on_album=1, stickers_collected=4
+        ))
+        user = to_model(make_user(package_counter=1, stickers_on_album=1, stickers_collected=4))
+        user.package_counter += 2
+
+        result = asyncio.run(UserManager(db).update("u1", user))
+
+        assert result.package_counter == 3
+        assert result.album_completion_pct == 5
+        db["users"].find_one.assert_not_called()
+        query, update = db["users"].find_one_and_update.call_args[0]
+        assert update == {"$inc": {"package_counter": 2}}
+
+
+class TestListUsers(unittest.TestCase):
+    def list_users(self, db, **kwargs):
+        async def run():
+            return [row async for row in UserManager(db).iter_users(**kwargs)]
+        return asyncio.run(run())
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_users_after_the_given_id(self):
+        db = MagicMock()
+        db["users"].find = MagicMock(return_value=FakeCursor([
+            make_user(_id="6373d6d5a1a1b8bd2f1e2f41", stickers_on_album=1, stickers_collected=4),
+            make_user(_id="6373d6d5a1a1b8bd2f1e2f42", stickers_on_album=1, stickers_collected=4),
+        ]))
+
+        rows = self.list_users(db, after="6373d6d5a1a1b8bd2f1e2f40", limit=1)
+
+        assert [r["_id"] for r in rows] == ["6373d6d5a1a1b8bd2f1e2f41"]
+        assert rows[0]["album_completion_pct"] == 5
+        assert db["users"].find.call_args[0] == (
+            {"_id": {"$gt": "6373d6d5a1a1b8bd2f1e2f40"}}, None
+        )
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_only_the_asked_fields_are_read(self):
+        db = MagicMock()
+        db["users"].find = MagicMock(return_value=FakeCursor([
+            {"_id": "1", "mail": "user@mail.com", "stickers_on_album": 10},
+        ]))
+
+        rows = self.list_users(db, fields=["mail", "album_completion_pct", "country"])
+
+        assert rows == [{
+            "_id": "1", "mail": "user@mail.com", "album_completion_pct": 50, "country": "",
+        }]
+        assert db["users"].find.call_args[0][1] == {
+            "mail": 1, "country": 1, "stickers_on_album": 1,
+        }
+
+
+class TestMailLookup(unittest.TestCase):
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_user_by_mail_ignores_case(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock(return_value=make_user())
+
+        asyncio.run(UserManager(db).get_user_by_mail("User@Mail.com"))
+
+        db["users"].find_one.assert_called_once_with({"mail_key": "user@mail.com"})
+
+    def test_users_by_mail_prefix_is_anchored_and_bounded(self):
+        db = MagicMock()
+        db["users"].find.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+
+        asyncio.run(UserManager(db).get_users_by_mail("John.D+1"))
+
+        query, projection = db["users"].find.call_args[0]
+        assert query == {"mail_key": {"$regex": "^john\\.d\\+1"}}
+        db["users"].find.return_value.limit.assert_called_once_with(50)
+
+    def test_mail_key_is_written_with_the_mail(self):
+        user = to_model(make_user())
+        user.mail = "New@Mail.com"
+
+        assert build_user_update(user)["$set"] == {
+            "mail": "New@Mail.com", "mail_key": "new@mail.com",
+        }
+
+    def test_new_user_is_stored_with_its_mail_key(self):
+        db = MagicMock()
+        db["users"].insert_one = AsyncMock()
+        db["registrations_daily"].update_one = AsyncMock()
+
+        new = asyncio.run(UserManager(db).add_new(to_model(make_user(mail="A@b.com"))))
+
+        assert db["users"].insert_one.call_args[0][0]["mail_key"] == "a@b.com"
+        assert "mail_key" not in new
+
+
+class TestDailyPackages(unittest.TestCase):
+    def test_availability_is_derived_from_the_last_claim(self):
+        assert to_model(make_user()).has_daily_packages_available
+        assert to_model(make_user(last_daily_claim="2022-11-27")).has_daily_packages_available
+        assert not to_model(make_user(
+            last_daily_claim=daily_package_date(), has_daily_packages_available=True
+        )).has_daily_packages_available
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_claim_is_one_conditional_update(self):
+        db = MagicMock()
+        db["users"].find_one = AsyncMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=make_user(
+            last_daily_claim=daily_package_date(), package_counter=2
+        ))
+
+        user = asyncio.run(UserManager(db).claim_daily_packages("u1"))
+
+        assert not user.has_daily_packages_available
+        assert user.package_counter == 2
+        query, update = db["users"].find_one_and_update.call_args[0]
+        # Parallel claims are credited once because the check is in the filter of one
+        # single-document update, which Mongo applies atomically
+        assert query == {"_id": "u1", "last_daily_claim": {"$ne": daily_package_date()}}
+        assert update == {
+            "$set": {"last_daily_claim": daily_package_date()},
+            "$inc": {"package_counter": 2},
+        }
+        assert db["users"].find_one_and_update.call_args[1] == {
+            "return_document": ReturnDocument.AFTER
+        }
+        db["users"].find_one.assert_not_called()
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_profile_packages_are_given_only_if_it_was_not_complete(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=make_user(
+            is_profile_complete=True, package_counter=3
+        ))
+
+        user = asyncio.run(UserManager(db).complete_profile("u1"))
+
+        assert user.is_profile_complete
+        query, update = db["users"].find_one_and_update.call_args[0]
+        assert query == {"_id": "u1", "is_profile_complete": {"$ne": True}}
+        assert update == {
+            "$set": {"is_profile_complete": True},
+            "$inc": {"package_counter": 3},
+        }
+
+    @patch("app.db.impl.user_manager.TOTAL_STICKERS_ALBUM", 20)
+    def test_profile_completed_by_a_concurrent_request(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=None)
+        db["users"].find_one = AsyncMock(return_value=make_user(
+            is_profile_complete=True, package_counter=3
+        ))
+
+        user = asyncio.run(UserManager(db).complete_profile("u1"))
+
+        assert user.package_counter == 3
+
+    def test_claim_twice_the_same_day(self):
+        db = MagicMock()
+        db["users"].find_one_and_update = AsyncMock(return_value=None)
+
+        assert asyncio.run(UserManager(db).claim_daily_packages("u1")) is None
+
+
+class TestUserSummaries(unittest.TestCase):
+    def test_summaries_are_projected_and_keep_the_order(self):
+        db = MagicMock()
+        db["users"].find.return_value.to_list = AsyncMock(return_value=[
+            {"_id": "b", "name": "nb", "lastname": "lb", "mail": "b@mail.com"},
+            {"_id": "a", "name": "na", "lastname": "la", "mail": "a@mail.com"},
+        ])
+
+        summaries = asyncio.run(UserManager(db).get_user_summaries(["a", "missing", "b", "a"]))
+
+        assert list(summaries.keys()) == ["a", "b"]
+        assert summaries["b"].name == "nb"
+        query, projection = db["users"].find.call_args[0]
+        assert query == {"_id": {"$in": ["a", "missing", "b"]}}
+        assert "stickers" not in projection
+
+
+class TestCommunitySlots(unittest.TestCase):
+    def test_slot_is_taken_only_under_the_limit(self):
+        db = MagicMock()
+        db["users"].update_one = AsyncMock(return_value=MagicMock(modified_count=0))
+
+        assert not asyncio.run(UserManager(db).reserve_community_slot("u1"))
+        query, update = db["users"].update_one.call_args[0]
+        assert query["communities_count"] == {"$not": {"$gte": 10}}
+        assert query["is_profile_complete"] is True
+        assert update == {"$inc": {"communities_count": 1}}
@@ -0,0 +1,55 @@
+import unittest
+
+from app.db.impl.user_manager import build_user_update, to_model
+from tests.factories import make_user
+
+
+class TestUserInventory(unittest.TestCase):
+    def test_get_sticker(self):
+        user = to_model(make_user())
+
+        assert user.get_sticker("s1").quantity == 2
+        assert user.get_sticker("s3") is None
+
+    def test_has_stickers_counts_repeated_ids(self):
+        user = to_model(make_user())
+
+        assert user.has_stickers(["s1", "s1", "s2"])
+        assert not user.has_stickers(["s2", "s2"])
+        assert not user.has_stickers(["s3"])
+
+    def test_add_sticker(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+
+        user.add_sticker("s1")
+        user.add_sticker("s3")
+
+        assert user.get_sticker("s1").quantity == 3
+        assert user.get_sticker("s3").quantity == 1
+        assert [s.id for s in user.stickers] == ["s1", "s2", "s3"]
+
+    def test_changes_through_the_inventory_are_written(self):
+        user = to_model(make_user(stickers_on_album=1, stickers_collected=4))
+
+        user.get_sticker("s2").quantity -= 1
+
+        assert build_user_update(user) == {
+            "$inc": {"stickers.1.quantity": -1, "stickers_collected": -1}
+        }
+
+    def test_inventory_follows_stickers_appended_to_the_list(self):
+        user = to_model(make_user())
+        user.inventory()
+
+        user.stickers.append(user.stickers[0].copy(update={"id": "s3"}))
+
+        assert user.get_sticker("s3") is not None
+
+    def test_inventory_follows_stickers_assigned_to_the_user(self):
+        user = to_model(make_user())
+        user.inventory()
+
+        user.stickers = [s.copy(update={"id": f"n{i}"}) for i, s in enumerate(user.stickers)]
+
+        assert user.get_sticker("s1") is None
+        assert user.get_sticker("n0") is user.stickers[0]
@@ -0,0 +1,56 @@
+"""
+    Documents and cursors shared by the tests of the managers
+"""
+from bson import ObjectId
+
+
+def make_sticker(weight: int, number: int = 1) -> dict:
+    return {
+        "_id": str(ObjectId()),
+        "name": f"player {number}",
+        "number": number,
+        "date_of_birth": "1987-06-24",
+        "height": 1.7,
+        "position": "CF",
+        "country": "ARG",
+        "image": "path/to/image",
+        "weight": weight,
+    }
+
+
+def make_user(**kwargs):
+    user = {
+        "_id": "6373d6d5a1a1b8bd2f1e2f40",
+        "mail": "user@mail.com",
+        "name": "name",
+        "lastname": "lastname",
+        "date_of_birth": "1990-01-01",
+        "stickers": [
+            {"id": "s1", "is_on_album": True, "quantity": 2},
+            {"id": "s2", "is_on_album": False, "quantity": 1},
+        ],
+    }
+    user.update(kwargs)
+    return user
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    def sort(self, key, direction):
+        return self
+
+    def limit(self, amount):
+        self.documents = self.documents[:amount]
+        return self
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for document in self.documents:
+            yield document
@@ -0,0 +1,119 @@
+import json
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from pymongo.errors import DuplicateKeyError
+from starlette.testclient import TestClient
+
+from app.db import get_database
+from app.db.impl.community_manager import GetCommunityManager
+from app.db.impl.user_manager import GetUserManager
+from app.db.model.user import UserModel
+from app.main import app
+
+
+def make_community(**kwargs):
+    community = {
+        "_id": "6373d6d5a1a1b8bd2f1e2f40",
+        "name": "community",
+        "owner": "owner",
+        "users": ["owner"],
+        "password": "secret",
+        "description": "",
+        "is_blocked": False,
+    }
+    community.update(kwargs)
+    return community
+
+
+class TestJoinCommunity(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.manager_mock = MagicMock()
+        self.user_manager_mock = MagicMock()
+        self.user_manager_mock.reserve_community_slot = AsyncMock(return_value=True)
+        self.user_manager_mock.release_community_slot = AsyncMock()
+        app.dependency_overrides[GetCommunityManager] = lambda: self.manager_mock
+        app.dependency_overrides[GetUserManager] = lambda: self.user_manager_mock
+
+    def test_join_is_one_update_on_each_collection(self):
+        self.manager_mock.join_community = AsyncMock(
+            return_value=make_community(users=["owner", "u1"])
+        )
+
+        response = self.client.post('/communities/c1/users/u1?password=secret')
+
+        assert response.status_code == 200
+        assert json.loads(response.content)["users"] == ["owner", "u1"]
+        self.manager_mock.join_community.assert_called_once_with(
+            community_id="c1", user_id="u1", password="secret"
+        )
+        self.user_manager_mock.release_community_slot.assert_not_called()
+
+    def test_full_community_releases_the_user_slot(self):
+        self.manager_mock.join_community = AsyncMock(return_value=None)
+        self.manager_mock.get_community_by_id = AsyncMock(return_value=make_community(
+            users=[f"u{i}" for i in range(11)]
+        ))
+
+        response = self.client.post('/communities/c1/users/u20?password=secret')
+
+        assert response.status_code == 400
+        assert "Full community" in json.loads(response.content)["detail"]
+        self.user_manager_mock.release_community_slot.assert_called_once_with("u20")
+
+    def test_wrong_password(self):
+        self.manager_mock.join_community = AsyncMock(return_value=None)
+        self.manager_mock.get_community_by_id = AsyncMock(return_value=make_community())
+
+        response = self.client.post('/communities/c1/users/u1?password=wrong')
+
+        assert response.status_code == 401
+        self.user_manager_mock.release_community_slot.assert_called_once_with("u1")
+
+    def test_user_in_too_many_communities(self):
+        self.user_manager_mock.reserve_community_slot = AsyncMock(return_value=False)
+        self.user_manager_mock.get_by_id = AsyncMock(return_value=UserModel(
+            mail="mail", name="name", lastname="lastname", date_of_birth="birth",
+            is_profile_complete=True
+        ))
+        self.manager_mock.join_community = AsyncMock()
+
+        response = self.client.post('/communities/c1/users/u1?password=secret')
+
+        assert response.status_code == 400
+        assert "more than 10 communities" in json.loads(response.content)["detail"]
+        self.manager_mock.join_community.assert_not_called()
+
+
+class TestUpdateCommunity(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        app.dependency_overrides[get_database] = lambda: MagicMock()
+
+    @patch("app.adapters.community_controller.CommunityManager")
+    def test_rename_to_an_existing_name(self, manager_class):
+        manager_class.return_value.update = AsyncMock(
+            side_effect=DuplicateKeyError("E11000 duplicate key error")
+        )
+
+        response = self.client.put(
+            "/communities/c1", json={"name": "Muller"}, headers={"X-User-Id": "owner"}
+        )
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "there is already a community with that name"
+
+    @patch("app.adapters.community_controller.CommunityManager")
+    def test_set_password_and_rename_to_an_existing_name(self, manager_class):
+        manager_class.return_value.get_by_id = AsyncMock(return_value=MagicMock(owner="owner"))
+        manager_class.return_value.update = AsyncMock(
+            side_effect=DuplicateKeyError("E11000 duplicate key error")
+        )
+
+        response = self.client.patch(
+            "/communities/c1", json={"name": "Muller", "password": "secret"},
+            headers={"X-User-Id": "owner"}
+        )
+
+        assert response.status_code == 400
@@ -6,7 +6,11 @@ from app.db.impl.user_manager import UserManager, GetUserManager
 from app.db.model.my_sticker import MyStickerModel
 from app.db.model.user import UserModel
 from app.db.model.exchange import ExchangeModel
-from unittest.mock import MagicMock, AsyncMock, ANY
+from unittest.mock import MagicMock, AsyncMock, ANY, patch
+from app.db.impl.community_manager import GetCommunityManager
+from app.adapters.dtos.community_details import UserNameResponse
+from app.adapters.exchange_controller import render_fetch
+import asyncio
 
 
 class TestExchangeManager(unittest.TestCase):
@@ -94,3 +98,74 @@ class TestExchangeManager(unittest.TestCase):
         exchangeManagerMock.get_exchange_by_id.assert_called_once_with(str(fakeExchange.id))
         responseBody = response.json()
         assert responseBody['detail'] == f"exchange {fakeExchange.id} is completed, you cannot apply any action"
+
+    @patch("app.adapters.exchange_controller.render_fetch", new_callable=AsyncMock)
+    def test_available_exchanges_use_the_user_quantities(self, render_fetch_mock):
+        client = TestClient(app)
+        exchangeManagerMock = MagicMock()
+        userManagerMock = MagicMock()
+        communityManagerMock = MagicMock()
+
+        app.dependency_overrides[GetExchangeManager] = lambda: exchangeManagerMock
+        app.dependency_overrides[GetUserManager] = lambda: userManagerMock
+        app.dependency_overrides[GetCommunityManager] = lambda: communityManagerMock
+
+        communityManagerMock.get_community_by_id = AsyncMock(return_value={
+            '_id': 'c1', 'users': ['u1', 'u2', 'u3'],
+        })
+        exchangeManagerMock.get_available_exchanges = AsyncMock(return_value=[
+            {'_id': 'e1', 'sender_id': 'u2', 'stickers_to_receive': ['s1']},
+        ])
+        userManagerMock.get_by_id = AsyncMock(return_value=UserModel(
+            mail='dani@test.com', name='dani', lastname='test', date_of_birth='25/03/1997',
+            stickers=[MyStickerModel(id='s1', is_on_album=False, quantity=2)]
+        ))
+        render_fetch_mock.side_effect = lambda exchanges: exchanges
+
+        response = client.get('/users/u1/communities/c1/exchanges')
+
+        assert response.status_code == 200
+        assert [e['_id'] for e in response.json()] == ['e1']
+        exchangeManagerMock.get_available_exchanges.assert_called_once_with(
+            'c1', ['u1', 'u2', 'u3'], 'u1', {'s1': 2}
+        )
+
+    def test_available_exchanges_for_non_member(self):
+        client = TestClient(app)
+        communityManagerMock = MagicMock()
+        app.dependency_overrides[GetExchangeManager] = lambda: MagicMock()
+        app.dependency_overrides[GetUserManager] = lambda: MagicMock()
+        app.dependency_overrides[GetCommunityManager] = lambda: communityManagerMock
+        communityManagerMock.get_community_by_id = AsyncMock(return_value={
+            '_id': 'c1', 'users': ['u2'],
+        })
+
+        response = client.get('/users/u1/communities/c1/exchanges')
+
+        assert response.status_code == 404
+
+    def test_render_fetch_reads_stickers_and_senders_at_once(self):
+        stickerManagerMock = MagicMock()
+        userManagerMock = MagicMock()
+        stickerManagerMock.get_by_ids = AsyncMock(return_value={
+            f's{i}': {'_id': f's{i}', 'name': f'sticker {i}'} for i in range(4)
+        })
+        userManagerMock.get_user_summaries = AsyncMock(return_value={
+            'u1': UserNameResponse(id='u1', name='dani', lastname='test', mail='dani@test.com'),
+        })
+        exchanges = [
+            {'sender_id': 'u1', 'stickers_to_receive': ['s0'], 'stickers_to_give': ['s1']},
+            {'sender_id': 'u2', 'stickers_to_receive': ['s2'], 'stickers_to_give': ['s3']},
+        ]
+
+        with patch("app.adapters.exchange_controller.GetStickerManager",
+                   AsyncMock(return_value=stickerManagerMock)), \
+                patch("app.adapters.exchange_controller.GetUserManager",
+                      AsyncMock(return_value=userManagerMock)):
+            result = asyncio.run(render_fetch(exchanges))
+
+        assert result[0]['stickers_to_give'] == [{'_id': 's1', 'name': 'sticker 1'}]
+        assert result[0]['sender']['_id'] == 'u1'
+        assert result[1]['sender'] is None
+        stickerManagerMock.get_by_ids.assert_called_once_with(['s0', 's1', 's2', 's3'])
+        userManagerMock.get_user_summaries.assert_called_once_with(['u1', 'u2'])
@@ -26,7 +26,7 @@ class TestReportsManager(unittest.TestCase):
             {'name': 'Gary Medel', 'country': 'CHI', 'counter': 34},
         ]
         stickerManagerMock.get_sticker_metrics_freq = AsyncMock(return_value=top5List)
-        stickerManagerMock.get_package_counter = AsyncMock(return_value=PackageCounterModel(counter=10))
+        stickerManagerMock.get_package_counter = AsyncMock(return_value=PackageCounterModel(counter=21, opened=10))
 
         response = client.get('/reports/stickers-metrics-freq?top5=True')
 
@@ -65,7 +65,7 @@ class TestReportsManager(unittest.TestCase):
             {'name': 'Gary Medel', 'country': 'CHI', 'counter': 34},
         ]
         stickerManagerMock.get_sticker_metrics_freq = AsyncMock(return_value=freqList)
-        stickerManagerMock.get_package_counter = AsyncMock(return_value=PackageCounterModel(counter=12))
+        stickerManagerMock.get_package_counter = AsyncMock(return_value=PackageCounterModel(counter=22, opened=12))
         firebaseManagerMock.uploadFile = MagicMock(return_value='ok')
 
         response = client.get('/reports/stickers-metrics-freq?generate_binary=true')
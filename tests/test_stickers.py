@@ -10,6 +10,7 @@ from app.db.impl.sticker_manager import GetStickerManager
 from app.db.model.package_counter import PackageCounterModel
 from app.firebase import GetFirebaseManager
 from unittest.mock import MagicMock, AsyncMock
+from fastapi import HTTPException
 from app.db.impl.report_manager import GetReportManager
 from fastapi_pagination import Page
 
@@ -49,6 +50,30 @@ class TestStickersManager(unittest.TestCase):
         stickerManagerMock.get_all.assert_called_once_with(None, 50, 1)
         assert len(response.json()['items']) == len(stickers)
 
+    def test_get_stickers_with_cursor(self):
+        client = TestClient(app)
+        stickerManagerMock = MagicMock()
+        app.dependency_overrides[GetStickerManager] = lambda: stickerManagerMock
+
+        sticker = StickerModel(
+            name='s1',
+            number=1,
+            date_of_birth='1998-03-02',
+            height=12.3,
+            position=10,
+            country='ARG',
+            image='path/to/image',
+        )
+        page = {"items": [sticker], "size": 1, "next_cursor": "abc", "total": None}
+        stickerManagerMock.get_all = AsyncMock(return_value=page)
+
+        response = client.get('/stickers?cursor=&size=1')
+
+        assert response.status_code == 200
+        stickerManagerMock.get_all.assert_called_once_with(None, 1, cursor='', with_total=False)
+        assert response.json()['next_cursor'] == "abc"
+        assert len(response.json()['items']) == 1
+
     def test_get_stickers_default_paginated_with_name(self):
         client = TestClient(app)
         stickerManagerMock = MagicMock()
@@ -116,3 +141,63 @@ class TestStickersManager(unittest.TestCase):
         assert response.status_code == 200
         stickerManagerMock.get_all.assert_called_once_with(None, 30, 3)
         assert len(response.json()['items']) == len(stickers)
+
+    def test_open_package_is_one_update_on_the_user(self):
+        client = TestClient(app)
+        stickerManagerMock = MagicMock()
+        userManagerMock = MagicMock()
+        app.dependency_overrides[GetStickerManager] = lambda: stickerManagerMock
+        app.dependency_overrides[GetUserManager] = lambda: userManagerMock
+        stickerManagerMock.create_package = AsyncMock(return_value='package')
+        userManagerMock.has_packages = AsyncMock(return_value=True)
+        userManagerMock.open_package = AsyncMock(return_value=[])
+
+        response = client.post('/stickers/package', json={'user_id': 'u1'})
+
+        assert response.status_code == 201
+        userManagerMock.has_packages.assert_called_once_with('u1')
+        userManagerMock.open_package.assert_called_once_with(package='package', user_id='u1')
+        userManagerMock.get_by_id.assert_not_called()
+        stickerManagerMock.metrics_writer.record.assert_called_once_with([])
+
+    def test_open_package_without_packages(self):
+        client = TestClient(app)
+        stickerManagerMock = MagicMock()
+        userManagerMock = MagicMock()
+        app.dependency_overrides[GetStickerManager] = lambda: stickerManagerMock
+        app.dependency_overrides[GetUserManager] = lambda: userManagerMock
+        stickerManagerMock.create_package = AsyncMock(return_value='package')
+        userManagerMock.has_packages = AsyncMock(return_value=False)
+
+        response = client.post('/stickers/package', json={'user_id': 'u1'})
+
+        assert response.status_code == 400
+        stickerManagerMock.create_package.assert_not_called()
+        stickerManagerMock.metrics_writer.record.assert_not_called()
+
+    def test_open_package_taken_by_a_concurrent_request(self):
+        client = TestClient(app)
+        stickerManagerMock = MagicMock()
+        userManagerMock = MagicMock()
+        app.dependency_overrides[GetStickerManager] = lambda: stickerManagerMock
+        app.dependency_overrides[GetUserManager] = lambda: userManagerMock
+        stickerManagerMock.create_package = AsyncMock(return_value='package')
+        userManagerMock.has_packages = AsyncMock(return_value=True)
+        userManagerMock.open_package = AsyncMock(side_effect=HTTPException(
+            status_code=400, detail="User u1 doesn't have any packages to open"
+        ))
+
+        response = client.post('/stickers/package', json={'user_id': 'u1'})
+
+        assert response.status_code == 400
+        stickerManagerMock.metrics_writer.record.assert_not_called()
+
+    def test_get_stickers_with_cursor_and_empty_size(self):
+        client = TestClient(app)
+        stickerManagerMock = MagicMock()
+        app.dependency_overrides[GetStickerManager] = lambda: stickerManagerMock
+
+        response = client.get('/stickers?cursor=&size=0')
+
+        assert response.status_code == 422
+        stickerManagerMock.get_all.assert_not_called()
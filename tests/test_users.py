@@ -1,9 +1,10 @@
 import json
 import unittest
-from unittest.mock import MagicMock, AsyncMock
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from starlette.testclient import TestClient
 
+from app.db import get_database
 from app.db.impl.user_manager import GetUserManager
 from app.db.model.user import UserModel
 from app.main import app
@@ -19,10 +20,9 @@ class TestUsersManager(unittest.TestCase):
         app.dependency_overrides[GetUserManager] = lambda: user_manager_mock
 
         user = UserModel(mail="mail1", name="name1", lastname="lastname1",
-                         date_of_birth="birth1", has_daily_packages_available=True,
-                         package_counter=1)
-        user_manager_mock.get_by_id = AsyncMock(return_value=user)
-        user_manager_mock.update = AsyncMock(return_value=user)
+                         date_of_birth="birth1", has_daily_packages_available=False,
+                         package_counter=3)
+        user_manager_mock.claim_daily_packages = AsyncMock(return_value=user)
 
         response = client.put('/users/123/packages/daily-package')
 
@@ -30,6 +30,7 @@ class TestUsersManager(unittest.TestCase):
         assert response.status_code == 200
         assert response_parsed["has_daily_packages_available"] is False
         assert response_parsed["package_counter"] == 3
+        user_manager_mock.claim_daily_packages.assert_called_once_with(id="123")
 
     def test_put_daily_packages_fails(self):
         client = TestClient(app)
@@ -37,15 +38,13 @@ class TestUsersManager(unittest.TestCase):
 
         app.dependency_overrides[GetUserManager] = lambda: user_manager_mock
 
-        user = UserModel(mail="mail1", name="name1", lastname="lastname1",
-                         date_of_birth="birth1", has_daily_packages_available=False)
-        user_manager_mock.get_by_id = AsyncMock(return_value=user)
+        user_manager_mock.claim_daily_packages = AsyncMock(return_value=None)
 
         response = client.put('/users/123/packages/daily-package')
 
         assert response.status_code == 400
 
-    def test_put_daily_packages_to_all_users(self):
+    def test_put_daily_packages_to_all_users_only_notifies(self):
         client = TestClient(app)
         user_manager_mock = MagicMock()
         firebase_manager_mock = MagicMock()
@@ -53,25 +52,67 @@ class TestUsersManager(unittest.TestCase):
         app.dependency_overrides[GetUserManager] = lambda: user_manager_mock
         app.dependency_overrides[GetFirebaseManager] = lambda: firebase_manager_mock
 
-        users_list = [
-            UserModel(mail="mail1", name="name1", lastname="lastname1",
-                      date_of_birth="birth1", has_daily_packages_available=False,
-                      fcmToken='token-re-loco'),
-            UserModel(mail="mail1", name="name1", lastname="lastname1",
-                      date_of_birth="birth1", has_daily_packages_available=False),
-        ]
+        async def iter_fcm_tokens():
+            yield 'token-re-loco'
 
-        user_manager_mock.get_all = AsyncMock(return_value=users_list)
-        user_manager_mock.update = AsyncMock(return_value=200)
+        user_manager_mock.iter_fcm_tokens = iter_fcm_tokens
         firebase_manager_mock.sendPush = MagicMock()
 
         response = client.put('/users/packages/daily-package')
 
-        response_parsed = json.loads(response.content)
-        assert response.status_code == 200
-        assert response_parsed[0]["has_daily_packages_available"] is True
-        assert response_parsed[1]["has_daily_packages_available"] is True
+        assert response.status_code == 202
+        user_manager_mock.update.assert_not_called()
         firebase_manager_mock.sendPush.assert_called_once_with(
             title="Reclama tus paquetes diarios!",
             description="Anda a Inicio para reclamar tus paquetes diarios",
             fcmToken='token-re-loco')
+
+    def test_get_users_streams_a_json_array(self):
+        client = TestClient(app)
+        user_manager_mock = MagicMock()
+
+        app.dependency_overrides[GetUserManager] = lambda: user_manager_mock
+
+        async def iter_users(after, limit, fields):
+            for i in range(3):
+                yield {"_id": str(i), "mail": f"mail{i}"}
+
+        user_manager_mock.iter_users = MagicMock(side_effect=iter_users)
+
+        response = client.get('/users?after=a&limit=3&fields=mail')
+
+        assert response.status_code == 200
+        assert json.loads(response.content) == [
+            {"_id": "0", "mail": "mail0"},
+            {"_id": "1", "mail": "mail1"},
+            {"_id": "2", "mail": "mail2"},
+        ]
+        user_manager_mock.iter_users.assert_called_once_with(after="a", limit=3, fields=["mail"])
+
+    def test_get_users_with_unknown_fields(self):
+        client = TestClient(app)
+        app.dependency_overrides[GetUserManager] = lambda: MagicMock()
+
+        response = client.get('/users?fields=mail,password')
+
+        assert response.status_code == 400
+
+    @patch("app.adapters.user_controller.UserManager")
+    def test_completing_the_profile_gives_the_packages_in_a_conditional_update(
+            self, manager_class
+    ):
+        client = TestClient(app)
+        app.dependency_overrides[get_database] = lambda: MagicMock()
+        user = UserModel(mail='dani@test.com', name='dani', lastname='test',
+                         date_of_birth='25/03/1997', country='ARG', favorite_countries=['ARG'])
+        manager_class.return_value.update = AsyncMock(return_value=user)
+        manager_class.return_value.complete_profile = AsyncMock(
+            return_value=user.copy(update={'is_profile_complete': True, 'package_counter': 3})
+        )
+
+        response = client.put('/users/u1', json={'country': 'ARG'})
+
+        assert response.status_code == 200
+        assert response.json()['package_counter'] == 3
+        manager_class.return_value.update.assert_called_once()
+        manager_class.return_value.complete_profile.assert_called_once_with(id='u1')